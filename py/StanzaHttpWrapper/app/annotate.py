@@ -0,0 +1,199 @@
+"""
+Офлайн-разметка корпуса без HTTP.
+
+Файлы входного каталога делятся на шарды, шарды обрабатываются пулом процессов
+(в каждом - только запрошенный пайплайн Stanza), результаты пишутся в output/shard-XXXXX.jsonl
+(или .parquet). manifest.json отмечает завершённые шарды, поэтому прерванный
+запуск продолжается с того же места:
+
+    python -m app.annotate ../../ts/corpus-final out/corpus-final --pipeline depparse --workers 4
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+_pipeline = None
+
+
+def read_text(path: str) -> str:
+    """Текст файла: поле text для JSON-файлов корпуса, иначе содержимое целиком"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content.strip()
+    if isinstance(data, dict) and 'text' in data:
+        return data['text']
+    return content.strip()
+
+
+def list_files(input_dir: str) -> List[str]:
+    return sorted(
+        os.path.relpath(os.path.join(root, name), input_dir)
+        for root, _, names in os.walk(input_dir)
+        for name in names
+    )
+
+
+def make_shards(files: List[str], shard_size: int) -> List[List[str]]:
+    return [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+
+
+def _fingerprint(pipeline: str, files: List[str], shard_size: int) -> str:
+    digest = hashlib.sha256(f"{pipeline}:{shard_size}".encode('utf-8'))
+    for name in files:
+        digest.update(name.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir: str) -> Optional[dict]:
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir: str, manifest: dict):
+    # Запись через временный файл, чтобы прерывание не оставило повреждённый манифест
+    path = os.path.join(output_dir, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _init_worker(pipeline: str, workers: int):
+    global _pipeline
+    import stanza
+    import torch
+
+    # Потоки torch делятся между процессами, иначе N процессов запускают N x cores потоков
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+    # Без NLPModels: общий пайплайн, пул потоков, pymorphy2 и кэши результатов
+    # офлайн-прогону не нужны и только умножали бы память на число процессов
+    _pipeline = stanza.Pipeline(
+        lang='ru',
+        processors=','.join(settings.STANZA_MODELS[pipeline]),
+        logging_level='WARN'
+    )
+
+
+def _write_shard(path: str, rows: List[Dict[str, object]], output_format: str):
+    tmp_path = path + '.tmp'
+    if output_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            'file': [row['file'] for row in rows],
+            'result': [json.dumps(row['result'], ensure_ascii=False) for row in rows]
+        })
+        pq.write_table(table, tmp_path)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def _process_shard(task: Tuple[int, List[str], str, str, int, str]) -> Tuple[int, int]:
+    import stanza
+
+    shard_id, files, input_dir, output_dir, batch_size, output_format = task
+    rows = []
+    for start in range(0, len(files), batch_size):
+        names = files[start:start + batch_size]
+        texts = [read_text(os.path.join(input_dir, name)) for name in names]
+        docs = _pipeline([stanza.Document([], text=text) for text in texts])
+        results = [doc.to_dict() for doc in docs]
+        rows.extend({'file': name, 'result': result} for name, result in zip(names, results))
+
+    _write_shard(os.path.join(output_dir, f'shard-{shard_id:05d}.{output_format}'), rows, output_format)
+    return shard_id, len(rows)
+
+
+def annotate(
+        input_dir: str,
+        output_dir: str,
+        pipeline: str,
+        workers: int,
+        shard_size: int,
+        batch_size: int,
+        output_format: str = 'jsonl'
+):
+    if pipeline not in settings.STANZA_MODELS:
+        raise ValueError(f"Unknown pipeline: {pipeline}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    files = list_files(input_dir)
+    shards = make_shards(files, shard_size)
+    fingerprint = _fingerprint(pipeline, files, shard_size)
+
+    manifest = load_manifest(output_dir)
+    if manifest is None or manifest['fingerprint'] != fingerprint or manifest['format'] != output_format:
+        if manifest is not None:
+            logger.warning("Input, pipeline or format changed since the last run, starting over")
+        manifest = {
+            'fingerprint': fingerprint,
+            'pipeline': pipeline,
+            'format': output_format,
+            'shards': len(shards),
+            'completed': {}
+        }
+        save_manifest(output_dir, manifest)
+
+    pending = [
+        (shard_id, shard, input_dir, output_dir, batch_size, output_format)
+        for shard_id, shard in enumerate(shards)
+        if str(shard_id) not in manifest['completed']
+    ]
+    logger.info(f"{len(files)} files, {len(shards)} shards, {len(pending)} to process")
+    if not pending:
+        return manifest
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=workers, initializer=_init_worker, initargs=(pipeline, workers)) as pool:
+        for shard_id, count in pool.imap_unordered(_process_shard, pending):
+            manifest['completed'][str(shard_id)] = count
+            save_manifest(output_dir, manifest)
+            logger.info(f"Shard {shard_id} done ({count} documents, {len(manifest['completed'])}/{len(shards)})")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-разметка каталога текстов пайплайнами Stanza")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--pipeline', default='depparse', choices=list(settings.STANZA_MODELS))
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--shard-size', type=int, default=1000, help="Файлов в шарде")
+    parser.add_argument('--batch-size', type=int, default=settings.STREAM_BATCH_SIZE, help="Документов в одном вызове Stanza")
+    parser.add_argument('--format', dest='output_format', default='jsonl', choices=['jsonl', 'parquet'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    annotate(
+        args.input_dir,
+        args.output_dir,
+        pipeline=args.pipeline,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        batch_size=args.batch_size,
+        output_format=args.output_format
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+Нагрузочные и микро-бенчмарки сервиса.
+
+Маршруты вызываются предложениями из корпуса ts/corpus-final либо в том же процессе
+(ASGI-транспорт httpx, без сети), либо через локальный uvicorn. Для каждого маршрута
+выводятся пропускная способность, p50/p95/p99 задержки и число ошибок, для всего
+прогона - пиковый RSS процесса сервиса. Результаты пишутся в JSON вместе с хэшем
+коммита, чтобы прогоны разных коммитов можно было сравнивать:
+
+    python -m app.benchmark ../../ts/corpus-final --mode inprocess --concurrency 8 --output bench.json
+    python -m app.benchmark ../../ts/corpus-final --mode uvicorn --routes pos,lemma --requests 500
+    python -m app.benchmark ../../ts/corpus-final --micro-only
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.annotate import list_files, read_text
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'^[а-яё]+(?:-[а-яё]+)?$', re.IGNORECASE)
+
+INFLECT_FEATURES = [
+    'Case=Gen|Number=Sing',
+    'Case=Dat|Number=Plur',
+    'Case=Ins|Number=Sing',
+    'Case=Loc|Number=Plur',
+    'Case=Acc|Number=Plur',
+]
+
+# Маршрут -> (путь, построитель тела запроса по выборке)
+ROUTES: Dict[str, Tuple[str, Callable[['Sample', random.Random], dict]]] = {
+    'pos': ('/api/v1/text/pos', lambda s, rnd: {'text': rnd.choice(s.sentences)}),
+    'ner': ('/api/v1/text/ner', lambda s, rnd: {'text': rnd.choice(s.sentences)}),
+    'depparse': ('/api/v1/text/depparse', lambda s, rnd: {'text': rnd.choice(s.sentences)}),
+    'lemma': ('/api/v1/morph/lemma', lambda s, rnd: {'word': rnd.choice(s.words)}),
+    'features': ('/api/v1/morph/features', lambda s, rnd: {'word': rnd.choice(s.words)}),
+    'inflect': ('/api/v1/morph/inflect', lambda s, rnd: {
+        'lemma': rnd.choice(s.words).lower(),
+        'features_str': rnd.choice(INFLECT_FEATURES)
+    }),
+    'sentence_features': ('/api/v1/morph/sentence_features', lambda s, rnd: {'sentence': rnd.choice(s.sentences)}),
+    'similarity': ('/api/v1/semantic/similarity/', lambda s, rnd: {
+        'word1': rnd.choice(s.vector_keys),
+        'word2': rnd.choice(s.vector_keys)
+    }),
+}
+
+# Части речи OpenCorpora -> теги UD в ключах словаря word2vec ('абонент_NOUN')
+VECTOR_POS = {
+    'NOUN': 'NOUN',
+    'ADJF': 'ADJ', 'ADJS': 'ADJ', 'COMP': 'ADJ',
+    'VERB': 'VERB', 'INFN': 'VERB', 'PRTF': 'VERB', 'PRTS': 'VERB', 'GRND': 'VERB',
+    'ADVB': 'ADV',
+}
+
+
+class Sample:
+    """Случайная выборка предложений корпуса и слов из них"""
+
+    def __init__(self, corpus_dir: str, size: int, seed: int = 0):
+        files = list_files(corpus_dir)
+        rnd = random.Random(seed)
+        names = rnd.sample(files, min(size, len(files)))
+        self.sentences = [text for text in (read_text(os.path.join(corpus_dir, name)) for name in names) if text]
+        self.words = [
+            token for sentence in self.sentences for token in sentence.split()
+            if WORD_RE.match(token)
+        ]
+        if not self.sentences or not self.words:
+            raise ValueError(f"No usable sentences in {corpus_dir}")
+        self._vector_keys: Optional[List[str]] = None
+
+    @property
+    def vector_keys(self) -> List[str]:
+        """Слова выборки в виде ключей word2vec (лемма_POS), иначе сходство считается по нулевым векторам"""
+        if self._vector_keys is None:
+            import pymorphy2
+
+            morph = pymorphy2.MorphAnalyzer()
+            keys = []
+            for word in self.words:
+                parsed = morph.parse(word.lower())[0]
+                if parsed.tag.POS in VECTOR_POS:
+                    keys.append(f"{parsed.normal_form}_{VECTOR_POS[parsed.tag.POS]}")
+            if not keys:
+                raise ValueError("No content words in the sample for the similarity route")
+            self._vector_keys = keys
+        return self._vector_keys
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'mean_ms': 0.0}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'mean_ms': float(values.mean())}
+
+
+def _peak_rss_self() -> int:
+    # ru_maxrss - в килобайтах на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _peak_rss_pid(pid: int) -> Optional[int]:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def run_route(
+        client,
+        path: str,
+        make_body: Callable[[Sample, random.Random], dict],
+        sample: Sample,
+        requests: int,
+        concurrency: int,
+        seed: int = 0
+) -> dict:
+    """requests запросов к одному маршруту, не более concurrency одновременно"""
+    rnd = random.Random(seed)
+    bodies = [make_body(sample, rnd) for _ in range(requests)]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(bodies):
+            body = bodies[position]
+            position += 1
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                code = str(response.status_code)
+            except Exception as e:
+                code = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if code == '200':
+                latencies.append(elapsed)
+            else:
+                errors[code] = errors.get(code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    return {
+        'path': path,
+        'requests': requests,
+        'concurrency': concurrency,
+        'ok': len(latencies),
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        **percentiles(latencies)
+    }
+
+
+async def run_routes(client, routes: List[str], sample: Sample, requests: int, concurrency: int, warmup: int) -> dict:
+    results = {}
+    for name in routes:
+        path, make_body = ROUTES[name]
+        # Прогрев: ленивая загрузка моделей не должна попадать в замеры
+        if warmup:
+            await run_route(client, path, make_body, sample, warmup, 1, seed=-1)
+        logger.info(f"Benchmarking {name} ({requests} requests, concurrency {concurrency})")
+        results[name] = await run_route(client, path, make_body, sample, requests, concurrency)
+        logger.info(
+            f"{name}: {results[name]['throughput_rps']:.1f} rps, "
+            f"p50 {results[name]['p50_ms']:.1f} ms, p99 {results[name]['p99_ms']:.1f} ms"
+        )
+    return results
+
+
+async def benchmark_inprocess(routes: List[str], sample: Sample, requests: int, concurrency: int, warmup: int) -> dict:
+    import httpx
+
+    from app.main import app
+
+    # lifespan_context выполняет обработчики startup/shutdown как сервер (router.startup есть не во всех версиях)
+    async with app.router.lifespan_context(app):
+        await app.state.warmup
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+            results = await run_routes(client, routes, sample, requests, concurrency, warmup)
+    return {'routes': results, 'peak_rss_bytes': _peak_rss_self()}
+
+
+async def benchmark_uvicorn(
+        routes: List[str],
+        sample: Sample,
+        requests: int,
+        concurrency: int,
+        warmup: int,
+        port: int,
+        startup_timeout: float
+) -> dict:
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=None) as client:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                try:
+                    if (await client.get('/api/v1/service/health/ready')).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                await asyncio.sleep(0.5)
+            results = await run_routes(client, routes, sample, requests, concurrency, warmup)
+        return {'routes': results, 'peak_rss_bytes': _peak_rss_pid(server.pid)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _time_call(func: Callable[[], object], repeat: int = 5, number: int = 0) -> dict:
+    timer = timeit.Timer(func)
+    if not number:
+        number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {'number': number, 'best_us': best * 1e6}
+
+
+def micro_benchmarks() -> Dict[str, dict]:
+    """Горячие функции морфологии и семантики без HTTP и моделей Stanza"""
+    from app.routers.semantic import cosine_similarity
+    from app.utils.tags import FeatureCodec, feature_codec, map_tags_to_pymorphy, parse_features
+
+    feats_strings = INFLECT_FEATURES + [
+        'Animacy=Inan|Case=Nom|Gender=Masc|Number=Sing',
+        'Aspect=Perf|Gender=Fem|Mood=Ind|Number=Sing|Tense=Past|VerbForm=Fin|Voice=Act',
+    ]
+    features = [parse_features(None, s) for s in feats_strings]
+    rnd = np.random.default_rng(0)
+    vectors = rnd.standard_normal((2, 300)).astype(np.float32)
+
+    results = {
+        'map_tags_to_pymorphy': _time_call(lambda: [map_tags_to_pymorphy(f) for f in features]),
+        'parse_features': _time_call(lambda: [parse_features(None, s) for s in feats_strings]),
+        'parse_feats_string': _time_call(lambda: [FeatureCodec({}).features(s) for s in feats_strings]),
+        'parse_feats_string_cached': _time_call(lambda: [feature_codec.features(s) for s in feats_strings]),
+        'encode_batch': _time_call(lambda: feature_codec.encode_batch(feats_strings).to_dicts()),
+        'cosine_similarity': _time_call(lambda: cosine_similarity(vectors[0], vectors[1])),
+    }
+    for name in ('map_tags_to_pymorphy', 'parse_features', 'parse_feats_string', 'parse_feats_string_cached', 'encode_batch'):
+        results[name]['per_item_us'] = results[name]['best_us'] / len(feats_strings)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные и микро-бенчмарки маршрутов API")
+    parser.add_argument('corpus_dir', help="Каталог корпуса (ts/corpus-final)")
+    parser.add_argument('--mode', default='inprocess', choices=['inprocess', 'uvicorn'])
+    parser.add_argument('--routes', default=','.join(ROUTES), help="Маршруты через запятую")
+    parser.add_argument('--requests', type=int, default=200, help="Запросов на маршрут")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5, help="Запросов прогрева на маршрут (не учитываются)")
+    parser.add_argument('--sample-size', type=int, default=1000, help="Файлов корпуса в выборке")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--startup-timeout', type=float, default=600.0)
+    parser.add_argument('--micro-only', action='store_true', help="Только микро-бенчмарки")
+    parser.add_argument('--output', default=None, help="JSON-файл результатов (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    routes = [route for route in args.routes.split(',') if route]
+    unknown = [route for route in routes if route not in ROUTES]
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(unknown)}")
+
+    sample = Sample(args.corpus_dir, args.sample_size, args.seed)
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'sample': {'sentences': len(sample.sentences), 'words': len(sample.words), 'seed': args.seed},
+        'micro': micro_benchmarks()
+    }
+    if not args.micro_only:
+        if args.mode == 'inprocess':
+            load = benchmark_inprocess(routes, sample, args.requests, args.concurrency, args.warmup)
+        else:
+            load = benchmark_uvicorn(
+                routes, sample, args.requests, args.concurrency, args.warmup, args.port, args.startup_timeout
+            )
+        report['load'] = {'mode': args.mode, **asyncio.run(load)}
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic_settings import BaseSettings
 
 
@@ -13,6 +15,76 @@ class Settings(BaseSettings):
         'lemma': ['tokenize', 'pos', 'lemma']
     }
 
+    # Пайплайн Stanza обрабатывает один вызов за раз (см. SerializedPipeline в app.utils.nlp).
+    # False - у каждого именованного пайплайна свои модели и своя очередь: pos, ner, lemma и depparse
+    # обрабатываются параллельно, но общие процессоры (tokenize, pos) загружаются в память несколько раз.
+    # True - один общий пайплайн со всеми процессорами, именованные пайплайны используют его подмножества:
+    # каждый процессор в памяти один раз, но все вызовы Stanza выполняются строго по очереди
+    STANZA_SHARED_PIPELINE: bool = False
+
+    # Микробатчинг: запросы к одному пайплайну копятся не дольше окна или до максимального размера пакета
+    STANZA_BATCH_WINDOW_MS: float = 5.0
+    STANZA_BATCH_MAX_SIZE: int = 32
+
+    # Кэш результатов Stanza: число записей в памяти (0 - выключен) и sqlite-файл (пусто - без диска).
+    # STANZA_MODELS_VERSION меняется при обновлении моделей, что делает старые записи недействительными
+    STANZA_RESULT_CACHE_SIZE: int = 10000
+    STANZA_RESULT_CACHE_PATH: str = ''
+    STANZA_MODELS_VERSION: str = '1'
+
+    # Размер внутреннего пакета потоковой разметки /api/v1/text/stream и предельная длина строки входа
+    STREAM_BATCH_SIZE: int = 64
+    STREAM_MAX_LINE_BYTES: int = 1024 * 1024
+
+    # Пул потоков для вызовов моделей (0 - по числу ядер) и ограничения нагрузки.
+    # Вызовы разных пайплайнов Stanza выполняются в пуле параллельно только при STANZA_SHARED_PIPELINE=False
+    NLP_WORKERS: int = 0
+    NLP_MAX_IN_FLIGHT: int = 64
+    NLP_MAX_QUEUE: int = 256
+
+    # word2vec: исходный файл и сконвертированная копия для mmap-загрузки
+    WORD2VEC_PATH: str = 'models/word_vectors.w2v'
+    WORD2VEC_MMAP_PATH: str = 'models/word_vectors.kv'
+
+    # Индекс приближённого поиска соседей (строится офлайн: python -m app.utils.ann)
+    ANN_INDEX_PATH: str = 'models/word_vectors.ivf'
+    ANN_N_LISTS: int = 0
+    ANN_N_PROBE: int = 8
+
+    # Кэш pymorphy2: разборы по слову и словоформы по (лемма, граммемы); политика 'lru' или 'fifo'
+    MORPH_PARSE_CACHE_SIZE: int = 100000
+    MORPH_INFLECT_CACHE_SIZE: int = 200000
+    MORPH_CACHE_POLICY: str = 'lru'
+
+    # Предвычисленная таблица словоформ для /morph/inflect (python -m app.utils.paradigms);
+    # используется, если каталог существует
+    MORPH_PARADIGMS_PATH: str = 'models/paradigms'
+
+    # Классификаторы ошибок из neuro/. Названия классов потокенной модели берутся из id2label чекпойнта;
+    # у чекпойнтов, сохранённых без них (LABEL_0, ...), - из label_list модуля GRAMMAR_TOKEN_LABELS_SOURCE.
+    # Предельная длина в подтокенах у каждой модели своя, как при обучении
+    GRAMMAR_BINARY_MODEL_PATH: str = 'neuro/cases-errors-binary/bert_binary_classifier'
+    GRAMMAR_BINARY_MAX_LENGTH: int = 256
+    GRAMMAR_TOKEN_MODEL_PATH: str = 'neuro/cases-errors-detection/results-more-classes/checkpoint-15500'
+    GRAMMAR_TOKEN_TOKENIZER: str = 'DeepPavlov/rubert-base-cased'
+    GRAMMAR_TOKEN_LABELS_SOURCE: str = 'neuro/cases-errors-detection/dataset.py'
+    GRAMMAR_TOKEN_MAX_LENGTH: int = 512
+    GRAMMAR_BATCH_WINDOW_MS: float = 10.0
+    GRAMMAR_BATCH_MAX_SIZE: int = 64
+    GRAMMAR_INFERENCE_BATCH_SIZE: int = 16
+
+    # Сбор гистограмм задержек (/api/v1/service/metrics); выключение убирает замеры с горячих путей
+    METRICS_ENABLED: bool = True
+
+    # Профиль прогрева при старте: имена пайплайнов STANZA_MODELS, а также 'morph', 'word2vec', 'ann',
+    # 'grammar_binary', 'grammar_token'. Модели грузятся параллельно, затем выполняется пробный вызов;
+    # до его окончания или если какая-то модель профиля не загрузилась, /api/v1/service/health/ready отвечает 503.
+    # Уже построенный индекс ANN_INDEX_PATH загружается и без 'ann' в профиле; его ошибка видна
+    # в статусе прогрева, но на готовность не влияет
+    WARMUP_MODELS: List[str] = ['pos', 'ner', 'lemma', 'depparse', 'morph']
+    WARMUP_WORKERS: int = 4
+    WARMUP_TEXT: str = 'Мама мыла раму, а кошка спала на тёплом окне.'
+
     TAG_MAPPING: dict = {
         'Nom': 'nomn',
         'Gen': 'gent',
@@ -44,6 +116,10 @@ class Settings(BaseSettings):
             "name": "Morphology",
             "description": "Морфологический анализ и генерация слов"
         },
+        {
+            "name": "Grammar",
+            "description": "Поиск грамматических ошибок нейросетевыми классификаторами"
+        },
         {
             "name": "Service",
             "description": "Сервисные endpoints"
@@ -1,4 +1,34 @@
+from typing import Optional
+
+from fastapi import HTTPException, Query, Request, status
+
 from app.utils.nlp import NLPModels
+from app.utils.columnar import COMPACT_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, msgpack
 from app.config import settings
 
-nlp_models = NLPModels(config=settings)
\ No newline at end of file
+nlp_models = NLPModels(config=settings)
+
+
+def get_response_format(
+        request: Request,
+        response_format: Optional[str] = Query(
+            None,
+            alias='format',
+            description="'json' (по умолчанию), 'compact' - параллельные массивы по полям, 'msgpack'"
+        )
+) -> str:
+    """Формат ответа из параметра format или заголовка Accept"""
+    if response_format is None:
+        accept = request.headers.get('accept', '')
+        if MSGPACK_MEDIA_TYPE in accept:
+            response_format = 'msgpack'
+        elif COMPACT_MEDIA_TYPE in accept:
+            response_format = 'compact'
+        else:
+            response_format = 'json'
+
+    if response_format not in ('json', 'compact', 'msgpack'):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Неизвестный формат: {response_format}")
+    if response_format == 'msgpack' and msgpack is None:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="msgpack не установлен")
+    return response_format
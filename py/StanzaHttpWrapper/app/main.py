@@ -1,8 +1,12 @@
-from fastapi import FastAPI
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from app.routers import text, morphology, service, semantic
+from app.routers import text, stream, morphology, service, semantic, grammar
 from app.config import settings
 from app.dependencies import nlp_models
+from app.utils.metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,19 +20,41 @@ app = FastAPI(
 
 # Подключение роутеров
 app.include_router(text.router)
+app.include_router(stream.router)
 app.include_router(morphology.router)
 app.include_router(service.router)
 app.include_router(semantic.router)
+app.include_router(grammar.router)
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    """Гистограмма длительности запросов по шаблону маршрута"""
+    if not metrics.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        metrics.observe(
+            'http_request_duration_seconds',
+            time.perf_counter() - start,
+            route=getattr(route, 'path', 'unmatched'),
+            method=request.method,
+            status=str(status_code)
+        )
 
 @app.on_event("startup")
 async def startup_event():
-    """Предзагрузка основных моделей при старте"""
-    try:
-        nlp_models.get_pipeline('pos')
-        nlp_models.get_pipeline('ner')
-        logger.info("Preloaded models: pos, ner")
-    except Exception as e:
-        logger.error(f"Startup error: {str(e)}")
+    """
+    Прогрев моделей профиля WARMUP_MODELS в фоне: сервер сразу отвечает на проверку
+    живости, а готовность (/api/v1/service/health/ready) наступает после прогрева
+    """
+    loop = asyncio.get_running_loop()
+    app.state.warmup = loop.run_in_executor(None, nlp_models.warm_up)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -0,0 +1,54 @@
+import logging
+
+from fastapi import APIRouter, HTTPException, status
+
+from app.dependencies import nlp_models
+from app.schemas.models import TextRequest, GrammarScoreResponse, GrammarTagResponse
+
+router = APIRouter(prefix="/api/v1/grammar", tags=["Grammar"])
+logger = logging.getLogger(__name__)
+
+
+def _request_text(request: TextRequest) -> str:
+    # Предтокенизированный вход склеивается по пробелам, как в корпусе
+    if request.text is not None:
+        return request.text
+    return ' '.join(token for sentence in request.tokens for token in sentence)
+
+
+@router.post("/score", response_model=GrammarScoreResponse)
+async def score_sentence(request: TextRequest):
+    """Оценка корректности предложения бинарным классификатором"""
+    try:
+        async with nlp_models.limit():
+            probability = await nlp_models.grammar.score_batcher.submit(_request_text(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Grammar score error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка классификации"
+        )
+    return GrammarScoreResponse(
+        text=_request_text(request),
+        correct_probability=probability,
+        label="Correct" if probability >= 0.5 else "inCorrect"
+    )
+
+
+@router.post("/tag", response_model=GrammarTagResponse)
+async def tag_errors(request: TextRequest):
+    """Разметка типов ошибок по словам"""
+    try:
+        async with nlp_models.limit():
+            words, labels = await nlp_models.grammar.tag_batcher.submit(_request_text(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Grammar tag error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка разметки"
+        )
+    return GrammarTagResponse(words=words, labels=labels)
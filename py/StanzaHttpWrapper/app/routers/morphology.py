@@ -7,24 +7,51 @@ from app.schemas.models import (
     LemmaRequest,
     MorphFeaturesResponse,
     InflectRequest,
-    InflectResponse
+    InflectResponse,
+    LemmaBatchRequest,
+    LemmaBatchResponse,
+    MorphFeaturesBatchResponse,
+    InflectBatchRequest,
+    InflectBatchResponse
 )
 from app.dependencies import nlp_models
-from app.utils.tags import parse_features, map_tags_to_pymorphy
+from app.utils.nlp import process_stanza_pipeline_batched
+from app.utils.tags import feature_codec, parse_features, map_tags_to_pymorphy
 import logging
 
 router = APIRouter(prefix="/api/v1/morph", tags=["Morphology"])
 logger = logging.getLogger(__name__)
 
 
+def _analyze_word(word: str):
+    """Одиночный токен обрабатывается в режиме pretokenized, без нейросетевого токенизатора"""
+    if word.split() == [word]:
+        return nlp_models.process('lemma', [[word]], pretokenized=True)
+    return nlp_models.process('lemma', word)
+
+
+def _analyze_words(words: List[str]):
+    """Один вызов Stanza по предтокенизированному входу: каждое слово - отдельное предложение"""
+    if not words:
+        return []
+    doc = nlp_models.process('lemma', [[word] for word in words], pretokenized=True)
+    # Результаты сопоставляются со словами по позиции: при потерянном или склеенном предложении
+    # лучше ошибка, чем признаки чужого слова
+    if len(doc.sentences) != len(words):
+        raise ValueError(f"Stanza returned {len(doc.sentences)} sentences for {len(words)} words")
+    return [sentence.words[0] for sentence in doc.sentences]
+
+
 @router.post("/lemma", response_model=Dict[str, str])
 async def get_lemma(request: LemmaRequest):
     """Получение леммы слова"""
     try:
-        doc = nlp_models.get_pipeline('lemma')(request.word)
+        doc = await nlp_models.run(_analyze_word, request.word)
         if doc.sentences and doc.sentences[0].words:
             return {"lemma": doc.sentences[0].words[0].lemma}
         return {"lemma": request.word}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Lemma error: {str(e)}")
         raise HTTPException(
@@ -37,7 +64,7 @@ async def get_lemma(request: LemmaRequest):
 async def get_morph_features(request: LemmaRequest):
     """Анализ морфологических признаков и части речи"""
     try:
-        doc = nlp_models.get_pipeline('lemma')(request.word)
+        doc = await nlp_models.run(_analyze_word, request.word)
         pos = None
         features = {}
 
@@ -45,15 +72,13 @@ async def get_morph_features(request: LemmaRequest):
             word_data = doc.sentences[0].words[0]
             pos = word_data.upos  # Universal POS-тег (например, "NOUN", "VERB")
 
-            # Парсим морфологические признаки
-            if word_data.feats:
-                for feat in word_data.feats.split('|'):
-                    if '=' in feat:
-                        key, val = feat.split('=', 1)
-                        features[key] = val
+            # Признаки из кэша кодека (разбор каждой различной строки feats выполняется один раз)
+            features = feature_codec.features(word_data.feats)
 
         return MorphFeaturesResponse(word=request.word, pos=pos, features=features)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Features error: {str(e)}")
         return MorphFeaturesResponse(word=request.word, pos=None, features={})
@@ -65,10 +90,9 @@ async def inflect_word(request: InflectRequest):
     try:
         features = parse_features(request.features, request.features_str)
         pymorphy_tags = map_tags_to_pymorphy(features)
-        print(pymorphy_tags)
-        parsed = nlp_models.morph.parse(request.lemma)[0]
-        print(parsed)
-        inflected = parsed.inflect(pymorphy_tags)
+        logger.debug(f"Inflect {request.lemma}: {pymorphy_tags}")
+        parsed, inflected = await nlp_models.run(nlp_models.morph.inflect, request.lemma, pymorphy_tags)
+        logger.debug(f"Parsed: {parsed}")
 
         if not inflected:
             raise ValueError(f"Can't inflect {request.lemma} with {features}")
@@ -81,9 +105,76 @@ async def inflect_word(request: InflectRequest):
             tag=str(parsed.tag),
             success=True
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(e)
 
+
+@router.post("/lemma/batch", response_model=LemmaBatchResponse)
+async def get_lemma_batch(request: LemmaBatchRequest):
+    """Получение лемм для списка слов (порядок сохраняется)"""
+    try:
+        words_data = await nlp_models.run(_analyze_words, request.words)
+        return LemmaBatchResponse(
+            lemmas=[word_data.lemma or word for word, word_data in zip(request.words, words_data)]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lemma batch error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка лемматизации"
+        )
+
+
+@router.post("/features/batch", response_model=MorphFeaturesBatchResponse)
+async def get_morph_features_batch(request: LemmaBatchRequest):
+    """Морфологические признаки и часть речи для списка слов (порядок сохраняется)"""
+    try:
+        words_data = await nlp_models.run(_analyze_words, request.words)
+        return MorphFeaturesBatchResponse(results=[
+            MorphFeaturesResponse(word=word, pos=word_data.upos, features=feature_codec.features(word_data.feats))
+            for word, word_data in zip(request.words, words_data)
+        ])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Features batch error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка морфологического анализа"
+        )
+
+
+def _inflect_batch(items: List[InflectRequest]) -> List[InflectResponse]:
+    # Разбор каждой леммы выполняется один раз на пакет (даже при MORPH_PARSE_CACHE_SIZE=0),
+    # повторяющиеся пары лемма + граммемы обслуживаются кэшем nlp_models.morph
+    parses = {}
+    results = []
+    for item in items:
+        features = parse_features(item.features, item.features_str)
+        parsed, inflected = nlp_models.morph.inflect(item.lemma, map_tags_to_pymorphy(features), parses)
+        if not inflected:
+            logger.warning(f"Can't inflect {item.lemma} with {features}")
+
+        results.append(InflectResponse(
+            lemma=item.lemma,
+            inflected=inflected.word if inflected else "",
+            requested_features=features,
+            normal_form=parsed.normal_form,
+            tag=str(parsed.tag),
+            success=bool(inflected)
+        ))
+    return results
+
+
+@router.post("/inflect/batch", response_model=InflectBatchResponse)
+async def inflect_word_batch(request: InflectBatchRequest):
+    """Генерация словоформ для списка пар лемма + граммемы (порядок сохраняется)"""
+    return InflectBatchResponse(results=await nlp_models.run(_inflect_batch, request.items))
+
 class SentenceRequest(BaseModel):
     sentence: str  # Предложение для анализа
 
@@ -103,30 +194,25 @@ async def get_sentence_morph_features(request: SentenceRequest):
     """
     try:
         # Обработка предложения через NLP-пайплайн
-        doc = nlp_models.get_pipeline('lemma')(request.sentence)
-        words_data = []
-
-        # Проходим по всем словам в предложении
-        for sentence in doc.sentences:
-            for word_data in sentence.words:
-                pos = word_data.upos  # Universal POS-тег (например, "NOUN", "VERB")
-                features = {}
-
-                # Парсим морфологические признаки
-                if word_data.feats:
-                    for feat in word_data.feats.split('|'):
-                        if '=' in feat:
-                            key, val = feat.split('=', 1)
-                            features[key] = val
-
-                # Добавляем данные о слове в список
-                words_data.append(
-                    WordMorphFeatures(word=word_data.text, pos=pos, features=features)
-                )
-
-        # Возвращаем результат
-        return SentenceMorphFeaturesResponse(sentence=request.sentence, words=words_data)
-
+        # (результат кэшируется по тексту предложения)
+        doc = await process_stanza_pipeline_batched('lemma', request.sentence, nlp_models)
+        words = [word_data for sentence in doc for word_data in sentence]
+
+        # Признаки всего предложения одним вызовом кодека; одинаковые строки feats разбираются один раз
+        features = feature_codec.encode_batch([word_data.get('feats') for word_data in words]).to_dicts()
+
+        # Ответ собирается из словарей: FastAPI проверяет его по response_model
+        # без построения отдельной модели на каждое слово
+        return {
+            "sentence": request.sentence,
+            "words": [
+                {"word": word_data['text'], "pos": word_data.get('upos'), "features": word_features}
+                for word_data, word_features in zip(words, features)
+            ]
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         # Логирование ошибки
         logger.error(f"Sentence features error: {str(e)}")
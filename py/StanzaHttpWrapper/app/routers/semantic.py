@@ -1,17 +1,27 @@
 import logging
+import os
+from typing import List, Optional
 
 import numpy as np
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, status
 
 from app.dependencies import nlp_models
-from app.schemas.models import CompareRequest
+from app.schemas.models import (
+    CompareRequest,
+    BulkCompareRequest,
+    CandidatesCompareRequest,
+    SimilarityBatchResponse,
+    MostSimilarRequest,
+    MostSimilarResponse,
+    NeighboursRequest,
+    SimilarWord
+)
 
 router = APIRouter(prefix="/api/v1/semantic", tags=["Semantic"])
 
 logger = logging.getLogger(__name__)
 
 def get_word_vector(word, model):
-    print(f"Первые 20 слов: {list(model.key_to_index.keys())[:20]}")
     try:
         return model[word]
     except KeyError:
@@ -20,17 +30,120 @@ def get_word_vector(word, model):
 def cosine_similarity(vec1, vec2):
     return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
+def _word_indices(words: List[str]) -> np.ndarray:
+    """Индексы слов в матрице векторов, -1 для отсутствующих в модели"""
+    key_to_index = nlp_models.word2Vec.key_to_index
+    return np.fromiter((key_to_index.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+
+def _unit_rows(indices: np.ndarray) -> np.ndarray:
+    # Отсутствующим словам соответствует нулевой вектор, их сходство с любым словом равно 0
+    rows = nlp_models.word2vec_unit[np.maximum(indices, 0)]
+    rows[indices < 0] = 0
+    return rows
+
+def bulk_similarity(words1: List[str], words2: List[str]) -> List[float]:
+    """Косинусное сходство попарно для двух списков слов одной матричной операцией"""
+    vectors1 = _unit_rows(_word_indices(words1))
+    vectors2 = _unit_rows(_word_indices(words2))
+    return np.einsum('ij,ij->i', vectors1, vectors2).tolist()
+
+def candidates_similarity(word: str, candidates: List[str]) -> List[float]:
+    """Косинусное сходство слова с каждым из кандидатов"""
+    vector = _unit_rows(_word_indices([word]))[0]
+    return (_unit_rows(_word_indices(candidates)) @ vector).tolist()
+
+def most_similar(word: str, topn: int) -> List[SimilarWord]:
+    index = nlp_models.word2Vec.key_to_index.get(word)
+    if index is None:
+        return []
+    unit = nlp_models.word2vec_unit
+    scores = unit @ unit[index]
+    scores[index] = -np.inf
+    topn = min(topn, len(scores) - 1)
+    if topn <= 0:
+        return []
+    best = np.argpartition(-scores, topn - 1)[:topn]
+    best = best[np.argsort(-scores[best])]
+    keys = nlp_models.word2Vec.index_to_key
+    return [SimilarWord(word=keys[i], similarity=float(scores[i])) for i in best]
+
+def ann_neighbours(word: str, topn: int, pos: Optional[str] = None) -> List[SimilarWord]:
+    """Ближайшие соседи по IVF-индексу с необязательным фильтром по POS-тегу"""
+    index = nlp_models.word2Vec.key_to_index.get(word)
+    if index is None:
+        return []
+    ids, scores = nlp_models.ann_index.search(
+        nlp_models.word2vec_unit[index],
+        k=topn,
+        n_probe=nlp_models.config.ANN_N_PROBE,
+        pos=pos,
+        exclude=index
+    )
+    keys = nlp_models.word2Vec.index_to_key
+    return [SimilarWord(word=keys[i], similarity=float(score)) for i, score in zip(ids, scores)]
+
+def _get_vectors(word1, word2):
+    # word2Vec загружается лениво, поэтому обращение к нему тоже выполняется в пуле
+    model = nlp_models.word2Vec
+    return get_word_vector(word1, model), get_word_vector(word2, model)
+
 @router.post("/similarity/")
 async def semantic_similarity(request: CompareRequest):
     word1 = request.word1
     word2 = request.word2
-    print(word1)
-    print(word2)
-    vec1 = get_word_vector(word1, nlp_models.word2Vec)
-    vec2 = get_word_vector(word2, nlp_models.word2Vec)
-    print(vec1)
-    print(vec2)
+    logger.debug(f"Similarity: {word1} / {word2}")
+    vec1, vec2 = await nlp_models.run(_get_vectors, word1, word2)
 
     similarity = cosine_similarity(vec1, vec2)
 
-    return {"similarity": float(similarity)}
\ No newline at end of file
+    return {"similarity": float(similarity)}
+
+@router.post("/similarity/bulk", response_model=SimilarityBatchResponse)
+async def semantic_similarity_bulk(request: BulkCompareRequest):
+    """Сходство для списка пар слов (порядок сохраняется)"""
+    similarities = await nlp_models.run(
+        bulk_similarity,
+        [pair.word1 for pair in request.pairs],
+        [pair.word2 for pair in request.pairs]
+    )
+    return SimilarityBatchResponse(similarities=similarities)
+
+@router.post("/similarity/candidates", response_model=SimilarityBatchResponse)
+async def semantic_similarity_candidates(request: CandidatesCompareRequest):
+    """Сходство одного слова со списком кандидатов (порядок сохраняется)"""
+    similarities = await nlp_models.run(candidates_similarity, request.word, request.candidates)
+    return SimilarityBatchResponse(similarities=similarities)
+
+@router.post("/most_similar", response_model=MostSimilarResponse)
+async def semantic_most_similar(request: MostSimilarRequest):
+    """Ближайшие по косинусному сходству слова словаря"""
+    neighbours = await nlp_models.run(most_similar, request.word, request.topn)
+    if not neighbours and request.word not in nlp_models.word2Vec.key_to_index:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Слово отсутствует в модели"
+        )
+    return MostSimilarResponse(word=request.word, neighbours=neighbours)
+
+@router.post("/neighbours", response_model=MostSimilarResponse)
+async def semantic_neighbours(request: NeighboursRequest):
+    """Приближённый поиск ближайших слов по IVF-индексу"""
+    # Наличие индекса проверяется без загрузки: она требует словаря word2vec и выполняется в пуле
+    if not os.path.isdir(nlp_models.config.ANN_INDEX_PATH):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Индекс ближайших соседей не построен"
+        )
+    if nlp_models.ann_error is not None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=nlp_models.ann_error)
+    try:
+        neighbours = await nlp_models.run(ann_neighbours, request.word, request.topn, request.pos)
+    except ValueError as e:
+        # Индекс построен по другому словарю и должен быть перестроен
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    if not neighbours and request.word not in nlp_models.word2Vec.key_to_index:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Слово отсутствует в модели"
+        )
+    return MostSimilarResponse(word=request.word, neighbours=neighbours)
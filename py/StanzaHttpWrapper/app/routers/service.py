@@ -1,5 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.dependencies import nlp_models
+from app.utils.metrics import metrics
 
 router = APIRouter(prefix="/api/v1/service", tags=["Service"])
 
@@ -8,5 +10,42 @@ async def health_check():
     """Проверка состояния сервиса"""
     return {
         "status": "ok",
+        "ready": nlp_models.ready,
+        "warmup": nlp_models.warmup_status,
         "loaded_models": list(nlp_models._pipelines.keys())
-    }
\ No newline at end of file
+    }
+
+@router.get("/health/live")
+async def liveness():
+    """Процесс жив и обслуживает запросы (модели могут ещё загружаться)"""
+    return {"status": "ok"}
+
+@router.get("/health/ready")
+async def readiness():
+    """Все модели профиля прогрева загружены; до этого или при ошибке загрузки - 503"""
+    if not nlp_models.ready:
+        failed = [name for name, state in nlp_models.warmup_status.items() if state == 'failed']
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "failed" if failed else "warming_up",
+                "failed": failed,
+                "warmup": nlp_models.warmup_status
+            }
+        )
+    return {"status": "ready", "warmup": nlp_models.warmup_status}
+
+@router.get("/cache")
+async def cache_stats():
+    """Статистика кэшей морфологического анализатора и результатов Stanza"""
+    return {
+        "morph_parse": nlp_models.morph.parse_cache.stats(),
+        "morph_inflect": nlp_models.morph.inflect_cache.stats(),
+        # Размер дискового кэша - запрос к sqlite под его замком, поэтому в пуле, а не в event loop
+        "stanza_results": await nlp_models.run(nlp_models.result_cache.stats)
+    }
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_export():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
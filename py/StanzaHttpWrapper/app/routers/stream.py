@@ -0,0 +1,173 @@
+import json
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+
+from app.config import settings
+from app.dependencies import nlp_models
+
+router = APIRouter(prefix="/api/v1/text", tags=["Text Processing"])
+logger = logging.getLogger(__name__)
+
+# Строка входа: (id, текст, ошибка); при ошибке текста нет
+_Item = Tuple[object, Optional[str], Optional[str]]
+
+
+class _InputStreamingResponse(StreamingResponse):
+    """
+    Потоковый ответ, генератор которого сам читает тело запроса.
+
+    StreamingResponse при ASGI spec < 2.4 параллельно слушает receive в ожидании разрыва
+    соединения и может забрать и потерять куски тела http.request. Здесь receive читает
+    только генератор (через request.stream()), а разрыв соединения он видит как ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except (ClientDisconnect, OSError):
+            logger.info("Client disconnected during stream")
+            return
+        if self.background is not None:
+            await self.background()
+
+
+def _error_line(item_id, message: str) -> bytes:
+    return json.dumps({"id": item_id, "error": message}, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+async def _read_lines(request: Request, max_line_bytes: int) -> AsyncIterator[Optional[bytes]]:
+    """
+    Построчное чтение тела запроса по мере поступления без буферизации всего входа.
+    Вместо строки длиннее max_line_bytes выдаётся None, а её остаток до перевода строки пропускается
+    """
+    pending: List[bytes] = []
+    size = 0
+    skipping = False
+    async for chunk in request.stream():
+        start = 0
+        end = chunk.find(b'\n')
+        while end >= 0:
+            if skipping:
+                skipping = False
+            elif size + end - start > max_line_bytes:
+                yield None
+            else:
+                yield b''.join(pending) + chunk[start:end]
+            pending, size = [], 0
+            start = end + 1
+            end = chunk.find(b'\n', start)
+        if skipping or start == len(chunk):
+            continue
+        size += len(chunk) - start
+        if size > max_line_bytes:
+            pending, size, skipping = [], 0, True
+            yield None
+        else:
+            pending.append(chunk[start:])
+    if pending:
+        yield b''.join(pending)
+
+
+def _parse_line(line: bytes, line_number: int, input_format: str) -> Optional[_Item]:
+    """Разбор строки входа; id из NDJSON сохраняется и для некорректного текста"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        if input_format == 'text':
+            return line_number, line.decode('utf-8'), None
+        item = json.loads(line)
+    except ValueError as e:
+        return line_number, None, f"Некорректная строка: {str(e)}"
+    if not isinstance(item, dict):
+        return line_number, None, "Некорректная строка: ожидается JSON-объект"
+    item_id = item.get('id', line_number)
+    if 'text' not in item:
+        return item_id, None, "Некорректная строка: нет поля text"
+    text = item['text']
+    if not isinstance(text, str):
+        return item_id, None, f"Некорректная строка: поле text должно быть строкой, получено {type(text).__name__}"
+    return item_id, text, None
+
+
+def _annotate(pipeline_name: str, texts: List[str]) -> List[dict]:
+    """Обработка пакета предложений: из кэша берутся готовые результаты, остальные - одним вызовом"""
+    keys = [nlp_models.result_key(pipeline_name, text) for text in texts]
+    # Диск для оставшихся проверяет process_documents
+    results = [nlp_models.result_cache.get_memory(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        processed = nlp_models.process_documents(pipeline_name, [texts[i] for i in missing])
+        for i, result in zip(missing, processed):
+            results[i] = result
+    return results
+
+
+async def _annotate_stream(request: Request, pipeline_name: str, input_format: str) -> AsyncIterator[bytes]:
+    # Строки с ошибками остаются в пакете на своих местах, чтобы порядок ответа совпадал с порядком входа
+    batch: List[_Item] = []
+
+    async def flush():
+        texts = [text for _, text, error in batch if error is None]
+        results = iter(())
+        failure = None
+        if texts:
+            try:
+                results = iter(await nlp_models.run(_annotate, pipeline_name, texts))
+            except Exception as e:
+                # Ошибка пакета не обрывает поток: по строке с ошибкой на каждый id пакета
+                logger.error(f"Stream batch of {len(texts)} failed: {str(e)}")
+                failure = f"Ошибка обработки: {str(e)}"
+        lines = []
+        for item_id, _, error in batch:
+            if error is None:
+                error = failure
+            if error is not None:
+                lines.append(_error_line(item_id, error))
+            else:
+                lines.append(
+                    json.dumps({"id": item_id, "result": next(results)}, ensure_ascii=False).encode('utf-8') + b'\n'
+                )
+        return b''.join(lines)
+
+    line_number = 0
+    async for line in _read_lines(request, settings.STREAM_MAX_LINE_BYTES):
+        if line is None:
+            item = (line_number, None, f"Строка длиннее {settings.STREAM_MAX_LINE_BYTES} байт")
+        else:
+            item = _parse_line(line, line_number, input_format)
+        line_number += 1
+        if item is None:
+            continue
+
+        batch.append(item)
+        if len(batch) >= settings.STREAM_BATCH_SIZE:
+            yield await flush()
+            batch = []
+
+    if batch:
+        yield await flush()
+
+
+@router.post("/stream")
+async def annotate_stream(
+        request: Request,
+        pipeline: str = Query('pos', description="Имя пайплайна из STANZA_MODELS"),
+        input_format: str = Query('ndjson', alias='format', description="'ndjson' ({\"id\", \"text\"} в строке) или 'text' (предложение в строке)")
+):
+    """
+    Потоковая разметка корпуса: на вход NDJSON или текст по строкам,
+    на выход - по одной JSON-строке на предложение по мере обработки.
+    """
+    if pipeline not in settings.STANZA_MODELS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Неизвестный пайплайн: {pipeline}")
+    if input_format not in ('ndjson', 'text'):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Неизвестный формат: {input_format}")
+    return _InputStreamingResponse(
+        _annotate_stream(request, pipeline, input_format),
+        media_type="application/x-ndjson"
+    )
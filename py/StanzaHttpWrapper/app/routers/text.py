@@ -1,36 +1,75 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from app.schemas.models import TextRequest
-from app.dependencies import nlp_models
-from app.utils.nlp import process_stanza_pipeline
+from razdel import sentenize, tokenize
+from app.schemas.models import TextRequest, SegmentBatchRequest
+from app.dependencies import nlp_models, get_response_format
+from app.utils.columnar import render_result
+from app.utils.nlp import process_stanza_pipeline_batched, process_stanza_pipeline_pretokenized
 import logging
 
 router = APIRouter(prefix="/api/v1/text", tags=["Text Processing"])
 logger = logging.getLogger(__name__)
 
+async def _process(pipeline_name: str, request: TextRequest):
+    if request.tokens is not None:
+        return await process_stanza_pipeline_pretokenized(
+            pipeline_name, request.tokens, nlp_models, request.processors
+        )
+    return await process_stanza_pipeline_batched(pipeline_name, request.text, nlp_models, request.processors)
+
 @router.post("/pos")
-async def process_pos(request: TextRequest):
+async def process_pos(request: TextRequest, response_format: str = Depends(get_response_format)):
     """POS-тэгинг текста"""
-    logger.info(f"Processing POS for text length: {len(request.text)}")
-    return {"result": process_stanza_pipeline('pos', request.text, nlp_models)}
+    logger.info(f"Processing POS for text length: {len(request.text or '')}")
+    result = await _process('pos', request)
+    return render_result(result, response_format)
 
 @router.post("/ner")
-async def process_ner(request: TextRequest):
+async def process_ner(request: TextRequest, response_format: str = Depends(get_response_format)):
     """Распознавание именованных сущностей"""
-    return {"result": process_stanza_pipeline('ner', request.text, nlp_models)}
+    result = await _process('ner', request)
+    return render_result(result, response_format)
 
 @router.post("/depparse")
-async def process_depparse(request: TextRequest):
+async def process_depparse(request: TextRequest, response_format: str = Depends(get_response_format)):
     """Анализ синтаксических зависимостей"""
-    return {"result": process_stanza_pipeline('depparse', request.text, nlp_models)}
+    result = await _process('depparse', request)
+    return render_result(result, response_format)
 
 @router.post("/sentence-split")
 async def sentence_split(request: TextRequest):
     """Разбивка текста на предложения"""
-    if not request.text.strip():
+    if not request.text or not request.text.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Текст не может быть пустым"
         )
-    from razdel import sentenize
     sentences = [s.text for s in sentenize(request.text)]
-    return {"sentences": sentences}
\ No newline at end of file
+    return {"sentences": sentences}
+
+
+def segment(text: str, with_tokens: bool = False, with_text: bool = True) -> dict:
+    """Границы предложений (и токенов razdel) как пары [start, stop] в символах исходного текста"""
+    sentences = list(sentenize(text))
+    result = {"sentences": [[s.start, s.stop] for s in sentences]}
+    if with_text:
+        result["texts"] = [s.text for s in sentences]
+    if with_tokens:
+        result["tokens"] = [
+            [[s.start + t.start, s.start + t.stop] for t in tokenize(s.text)]
+            for s in sentences
+        ]
+    return result
+
+
+def _segment_batch(texts, with_tokens, with_text):
+    return [segment(text, with_tokens, with_text) for text in texts]
+
+
+@router.post("/sentence-split/batch")
+async def sentence_split_batch(request: SegmentBatchRequest):
+    """
+    Разбивка набора документов на предложения razdel без вызова нейросетевого токенизатора.
+    Для каждого документа возвращаются смещения предложений и, по запросу, токенов.
+    """
+    documents = await nlp_models.run(_segment_batch, request.texts, request.return_tokens, request.include_text)
+    return {"documents": documents}
\ No newline at end of file
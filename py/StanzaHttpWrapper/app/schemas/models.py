@@ -1,14 +1,30 @@
 from typing import List, Dict, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, constr, model_validator
 
 class TextRequest(BaseModel):
-    text: str = Field(..., min_length=1, example="Привет, мир!", description="Текст для обработки")
+    text: Optional[str] = Field(None, min_length=1, example="Привет, мир!", description="Текст для обработки")
+    tokens: Optional[List[List[str]]] = Field(
+        None,
+        example=[["Привет", ",", "мир", "!"]],
+        description="Предтокенизированный текст: список предложений из токенов (вместо text)"
+    )
     processors: Optional[List[str]] = Field(
         None,
         example=["pos", "lemma"],
-        description="Список процессоров (опционально)"
+        description="Список процессоров Stanza вместо стандартного набора эндпоинта (опционально)"
     )
 
+    @model_validator(mode='after')
+    def check_input(self):
+        if (self.text is None) == (self.tokens is None):
+            raise ValueError("Нужно указать ровно одно из полей text и tokens")
+        return self
+
+class SegmentBatchRequest(BaseModel):
+    texts: List[str] = Field(..., example=["Привет, мир! Как дела?"], description="Документы для сегментации")
+    return_tokens: bool = Field(False, description="Возвращать также смещения токенов")
+    include_text: bool = Field(True, description="Возвращать тексты предложений, а не только смещения")
+
 class LemmaRequest(BaseModel):
     word: str = Field(..., min_length=1, example="кошкам", description="Слово для лемматизации")
 
@@ -38,6 +54,61 @@ class InflectResponse(BaseModel):
     tag: str
     success: bool
 
+class LemmaBatchRequest(BaseModel):
+    words: List[constr(min_length=1, strip_whitespace=True)] = Field(
+        ...,
+        example=["кошкам", "домов"],
+        description="Слова для обработки (пустые и из одних пробелов не допускаются)"
+    )
+
+class LemmaBatchResponse(BaseModel):
+    lemmas: List[str]
+
+class MorphFeaturesBatchResponse(BaseModel):
+    results: List[MorphFeaturesResponse]
+
+class InflectBatchRequest(BaseModel):
+    items: List[InflectRequest] = Field(..., description="Пары лемма + граммемы")
+
+class InflectBatchResponse(BaseModel):
+    results: List[InflectResponse]
+
 class CompareRequest(BaseModel):
     word1: str
-    word2: str
\ No newline at end of file
+    word2: str
+
+class BulkCompareRequest(BaseModel):
+    pairs: List[CompareRequest] = Field(..., description="Пары слов для сравнения")
+
+class CandidatesCompareRequest(BaseModel):
+    word: str = Field(..., example="адресат")
+    candidates: List[str] = Field(..., example=["адресант", "получатель"], description="Слова-кандидаты")
+
+class SimilarityBatchResponse(BaseModel):
+    similarities: List[float]
+
+class MostSimilarRequest(BaseModel):
+    word: str = Field(..., example="кошка")
+    topn: int = Field(10, ge=1, le=1000, description="Количество ближайших слов")
+
+class SimilarWord(BaseModel):
+    word: str
+    similarity: float
+
+class MostSimilarResponse(BaseModel):
+    word: str
+    neighbours: List[SimilarWord]
+
+class NeighboursRequest(BaseModel):
+    word: str = Field(..., example="адресат_NOUN")
+    topn: int = Field(10, ge=1, le=1000, description="Количество ближайших слов")
+    pos: Optional[str] = Field(None, example="NOUN", description="Фильтр по POS-тегу из ключа словаря")
+
+class GrammarScoreResponse(BaseModel):
+    text: str
+    correct_probability: float
+    label: str
+
+class GrammarTagResponse(BaseModel):
+    words: List[str]
+    labels: List[Optional[str]]
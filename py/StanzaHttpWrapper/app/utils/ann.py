@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def pos_from_key(key: str) -> Optional[str]:
+    """POS-тег из ключа словаря вида 'кошка_NOUN'"""
+    if '_' not in key:
+        return None
+    return key.rsplit('_', 1)[1]
+
+
+def keys_fingerprint(keys: List[str]) -> str:
+    """Хэш словаря word2vec: индекс хранит номера строк матрицы и годится только для того же словаря"""
+    digest = hashlib.sha256()
+    for key in keys:
+        digest.update(key.encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+class IVFIndex:
+    """
+    Приближённый поиск ближайших соседей (IVF) по нормированным векторам.
+
+    Векторы разбиты сферическим k-means на n_lists кластеров и хранятся
+    переупорядоченными по кластерам, поэтому поиск просматривает n_probe
+    непрерывных срезов матрицы вместо всего словаря.
+    Вместе с индексом сохраняются размер и хэш словаря (meta.json): индекс другого
+    словаря (например, после переконвертации WORD2VEC_PATH) не загружается.
+    """
+
+    def __init__(
+            self,
+            centroids: np.ndarray,
+            vectors: np.ndarray,
+            ids: np.ndarray,
+            offsets: np.ndarray,
+            pos_codes: np.ndarray,
+            pos_tags: List[str],
+            meta: Optional[dict] = None
+    ):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.pos_codes = pos_codes
+        self.pos_tags = pos_tags
+        self.meta = meta or {}
+
+    @classmethod
+    def build(
+            cls,
+            unit: np.ndarray,
+            keys: List[str],
+            n_lists: int = 0,
+            n_iter: int = 10,
+            sample_size: int = 100000,
+            seed: int = 0
+    ) -> 'IVFIndex':
+        rng = np.random.default_rng(seed)
+        n_lists = n_lists or max(1, int(np.sqrt(len(unit))))
+
+        sample = unit[rng.choice(len(unit), size=min(sample_size, len(unit)), replace=False)]
+        centroids = np.array(sample[rng.choice(len(sample), size=n_lists, replace=False)], dtype=np.float32)
+        for _ in range(n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids /= norms
+
+        assignment = np.concatenate([
+            np.argmax(unit[start:start + 65536] @ centroids.T, axis=1)
+            for start in range(0, len(unit), 65536)
+        ])
+        ids = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+
+        pos_tags = sorted({tag for tag in map(pos_from_key, keys) if tag})
+        tag_codes = {tag: code for code, tag in enumerate(pos_tags)}
+        pos_codes = np.array([tag_codes.get(pos_from_key(keys[i]), -1) for i in ids], dtype=np.int16)
+
+        meta = {'n_keys': len(keys), 'keys_sha256': keys_fingerprint(keys)}
+        return cls(centroids, np.ascontiguousarray(unit[ids], dtype=np.float32), ids, offsets, pos_codes, pos_tags, meta)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ('centroids', 'vectors', 'ids', 'offsets', 'pos_codes'):
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'pos_tags.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.pos_tags, f, ensure_ascii=False)
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, path: str, keys: Optional[List[str]] = None) -> 'IVFIndex':
+        """Загрузка через mmap; если заданы keys, индекс должен быть построен по этому же словарю"""
+        meta_path = os.path.join(path, 'meta.json')
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        if keys is not None and (
+                meta.get('n_keys') != len(keys) or meta.get('keys_sha256') != keys_fingerprint(keys)
+        ):
+            raise ValueError(f"IVF index {path} was built for another word2vec vocabulary, rebuild it")
+
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in ('centroids', 'vectors', 'ids', 'offsets', 'pos_codes')
+        }
+        with open(os.path.join(path, 'pos_tags.json'), encoding='utf-8') as f:
+            pos_tags = json.load(f)
+        return cls(pos_tags=pos_tags, meta=meta, **arrays)
+
+    def search(
+            self,
+            query: np.ndarray,
+            k: int,
+            n_probe: int,
+            pos: Optional[str] = None,
+            exclude: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Индексы (в порядке словаря word2vec) и сходства k ближайших соседей.
+        Просматриваются n_probe ближайших кластеров; если после фильтра по POS и exclude
+        кандидатов меньше k, просмотр продолжается по следующим кластерам
+        """
+        if pos is not None and pos not in self.pos_tags:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        pos_code = self.pos_tags.index(pos) if pos is not None else None
+
+        ids, scores = [], []
+        found = 0
+        for probed, list_id in enumerate(np.argsort(-(self.centroids @ query))):
+            if probed >= n_probe and found >= k:
+                break
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            list_scores = self.vectors[start:end] @ query
+            list_ids = self.ids[start:end]
+            keep = np.ones(len(list_ids), dtype=bool)
+            if pos_code is not None:
+                keep &= self.pos_codes[start:end] == pos_code
+            if exclude is not None:
+                keep &= list_ids != exclude
+            ids.append(list_ids[keep])
+            scores.append(list_scores[keep])
+            found += len(ids[-1])
+
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        k = min(k, len(ids))
+        if k == 0:
+            return ids[:0], scores[:0]
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return ids[best], scores[best]
+
+
+if __name__ == '__main__':
+    from app.config import settings
+    from app.utils.vectors import load_word2vec, load_unit_vectors
+
+    parser = argparse.ArgumentParser(description="Построение IVF-индекса ближайших соседей по word2vec")
+    parser.add_argument('--output', default=settings.ANN_INDEX_PATH)
+    parser.add_argument('--lists', type=int, default=settings.ANN_N_LISTS, help="Число кластеров (0 - sqrt от словаря)")
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    vectors = load_word2vec(settings.WORD2VEC_PATH, settings.WORD2VEC_MMAP_PATH)
+    unit = load_unit_vectors(vectors, settings.WORD2VEC_MMAP_PATH)
+    logger.info(f"Building IVF index over {len(unit)} vectors")
+    IVFIndex.build(unit, vectors.index_to_key, n_lists=args.lists, n_iter=args.iterations).save(args.output)
+    logger.info(f"Index saved to {args.output}")
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Очередь запросов, собирающая конкурентные вызовы в один пакет.
+
+    Запросы накапливаются не дольше window_ms миллисекунд или до max_size штук,
+    после чего process_batch вызывается один раз на весь пакет в пуле executor
+    (по умолчанию - пул event loop).
+    process_batch должен вернуть результаты в том же порядке, что и входы.
+    Если пакет падает или возвращает не столько результатов, сколько было входов,
+    каждый запрос пакета повторяется отдельно: ошибка одного документа
+    не должна превращаться в 500 для соседей по пакету.
+    """
+
+    def __init__(
+            self,
+            process_batch: Callable[[List[Any]], List[Any]],
+            window_ms: float,
+            max_size: int,
+            executor: Optional[Executor] = None
+    ):
+        self._process_batch = process_batch
+        self._executor = executor
+        self._window = window_ms / 1000
+        self._max_size = max(1, max_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        """Число запросов, ожидающих формирования пакета"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item: Any) -> Any:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._window
+        while len(batch) < self._max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _call(self, items: List[Any]) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self._executor, self._process_batch, items)
+        if len(results) != len(items):
+            raise RuntimeError(f"process_batch returned {len(results)} results for {len(items)} items")
+        return results
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await self._call(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    _, future = batch[0]
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                logger.error(f"Batch of {len(items)} failed, retrying items one by one: {str(e)}")
+                for item, future in batch:
+                    try:
+                        result = (await self._call([item]))[0]
+                    except Exception as item_error:
+                        if not future.done():
+                            future.set_exception(item_error)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Ограниченный потокобезопасный кэш со счётчиками попаданий.
+
+    policy='lru' вытесняет давно не использованные записи, 'fifo' - самые старые
+    по времени добавления. maxsize=0 отключает кэширование.
+    """
+
+    def __init__(self, maxsize: int, policy: str = 'lru'):
+        if policy not in ('lru', 'fifo'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                if self.policy == 'lru':
+                    self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class SqliteCache:
+    """
+    Дисковый кэш JSON-значений в sqlite. Записи другой версии моделей
+    удаляются при открытии, поэтому смена версии в конфиге сбрасывает кэш.
+    """
+
+    def __init__(self, path: str, version: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT, value TEXT)"
+            )
+            deleted = self._conn.execute("DELETE FROM results WHERE version != ?", (version,)).rowcount
+        if deleted:
+            logger.info(f"Invalidated {deleted} cached results of other model versions")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ? AND version = ?", (key, self.version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, version, value) VALUES (?, ?, ?)",
+                (key, self.version, data)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class ResultCache:
+    """
+    Двухуровневый кэш результатов: LRU в памяти процесса и необязательный sqlite на диске.
+    В event loop допустим только get_memory: обращения к диску (get, get_disk, put)
+    блокируются на I/O и замке sqlite и выполняются в пуле потоков.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SqliteCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        return self.get_disk(key, default)
+
+    def get_memory(self, key: str, default: Any = None) -> Any:
+        """Только уровень в памяти - без блокирующих операций"""
+        return self.memory.get(key, default)
+
+    def get_disk(self, key: str, default: Any = None) -> Any:
+        """Только уровень на диске; найденное значение поднимается в память"""
+        if self.disk is None:
+            return default
+        value = self.disk.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
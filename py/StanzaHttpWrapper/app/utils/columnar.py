@@ -0,0 +1,54 @@
+import json
+from typing import Any, Dict, List
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack - необязательная зависимость
+    msgpack = None
+
+COLUMNAR_FIELDS = ('text', 'lemma', 'upos', 'xpos', 'feats', 'head', 'deprel', 'ner', 'start_char', 'end_char')
+
+COMPACT_MEDIA_TYPE = 'application/vnd.columnar+json'
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+
+
+def to_columnar(doc: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Преобразование doc.to_dict() в параллельные массивы по полям.
+    Предложение i занимает позиции sentences[i]..sentences[i + 1] во всех массивах;
+    поля, которых нет ни у одного слова, не выводятся.
+    """
+    words = [word for sentence in doc for word in sentence if isinstance(word.get('id'), int)]
+    offsets = [0]
+    for sentence in doc:
+        offsets.append(offsets[-1] + sum(1 for word in sentence if isinstance(word.get('id'), int)))
+
+    result: Dict[str, Any] = {"sentences": offsets}
+    for field in COLUMNAR_FIELDS:
+        column = [word.get(field) for word in words]
+        if any(value is not None for value in column):
+            result[field] = column
+    return result
+
+
+def _dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def render_result(result: Any, response_format: str):
+    """Ответ эндпоинта Stanza в согласованном формате ('json', 'compact' или 'msgpack')"""
+    if response_format == 'json':
+        return {"result": result}
+    content = {"result": to_columnar(result)}
+    if response_format == 'msgpack':
+        return Response(content=msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
+    return Response(content=_dumps(content), media_type=COMPACT_MEDIA_TYPE)
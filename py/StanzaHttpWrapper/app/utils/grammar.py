@@ -0,0 +1,150 @@
+import importlib.util
+import logging
+import re
+import threading
+from concurrent.futures import Executor
+from typing import List, Optional, Tuple
+
+from app.utils.batching import MicroBatcher
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Названия классов, которые transformers подставляет, если модель обучена без id2label
+GENERIC_LABEL_RE = re.compile(r'^LABEL_\d+$')
+
+
+class GrammarModels:
+    """
+    Классификаторы ошибок из neuro/: бинарная оценка корректности предложения
+    и потокенная разметка типов ошибок. Модели загружаются при первом обращении,
+    конкурентные запросы объединяются в пакеты, внутри пакета тексты сортируются
+    по длине и обрабатываются подпакетами с минимальным паддингом.
+    """
+
+    def __init__(self, config, executor: Optional[Executor] = None):
+        self.config = config
+        self._binary = None
+        self._token = None
+        self.token_labels: List[str] = []
+        self._lock = threading.Lock()
+        self.score_batcher = MicroBatcher(
+            self.score_batch,
+            window_ms=config.GRAMMAR_BATCH_WINDOW_MS,
+            max_size=config.GRAMMAR_BATCH_MAX_SIZE,
+            executor=executor
+        )
+        self.tag_batcher = MicroBatcher(
+            self.tag_batch,
+            window_ms=config.GRAMMAR_BATCH_WINDOW_MS,
+            max_size=config.GRAMMAR_BATCH_MAX_SIZE,
+            executor=executor
+        )
+
+    @staticmethod
+    def _load(model_class: str, model_path: str, tokenizer_path: str):
+        import transformers
+
+        tokenizer = transformers.AutoTokenizer.from_pretrained(tokenizer_path)
+        model = getattr(transformers, model_class).from_pretrained(model_path)
+        model.eval()
+        return tokenizer, model
+
+    @property
+    def binary(self):
+        if self._binary is None:
+            with self._lock:
+                if self._binary is None:
+                    with metrics.load_timer('grammar_binary'):
+                        self._binary = self._load(
+                            'AutoModelForSequenceClassification',
+                            self.config.GRAMMAR_BINARY_MODEL_PATH,
+                            self.config.GRAMMAR_BINARY_MODEL_PATH
+                        )
+        return self._binary
+
+    @property
+    def token(self):
+        if self._token is None:
+            with self._lock:
+                if self._token is None:
+                    with metrics.load_timer('grammar_token'):
+                        token = self._load(
+                            'AutoModelForTokenClassification',
+                            self.config.GRAMMAR_TOKEN_MODEL_PATH,
+                            self.config.GRAMMAR_TOKEN_TOKENIZER
+                        )
+                        self.token_labels = self._labels(token[1])
+                        self._token = token
+        return self._token
+
+    def _labels(self, model) -> List[str]:
+        """Названия классов по номерам: из id2label чекпойнта или label_list датасета обучения"""
+        id2label = model.config.id2label
+        labels = [id2label[i] for i in range(len(id2label))]
+        if not all(GENERIC_LABEL_RE.match(label) for label in labels):
+            return labels
+
+        source = self.config.GRAMMAR_TOKEN_LABELS_SOURCE
+        spec = importlib.util.spec_from_file_location('grammar_token_dataset', source)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if len(module.label_list) != len(labels):
+            raise ValueError(f"label_list in {source} has {len(module.label_list)} labels, the model - {len(labels)}")
+        return list(module.label_list)
+
+    def _sub_batches(self, lengths: List[int]) -> List[List[int]]:
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        size = self.config.GRAMMAR_INFERENCE_BATCH_SIZE
+        return [order[i:i + size] for i in range(0, len(order), size)]
+
+    def score_batch(self, texts: List[str]) -> List[float]:
+        """Вероятность того, что предложение корректно (класс 1 бинарного классификатора)"""
+        import torch
+
+        tokenizer, model = self.binary
+        scores: List[float] = [0.0] * len(texts)
+        with torch.inference_mode():
+            for indices in self._sub_batches([len(text) for text in texts]):
+                encoding = tokenizer(
+                    [texts[i] for i in indices],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.config.GRAMMAR_BINARY_MAX_LENGTH,
+                    return_tensors='pt'
+                )
+                probabilities = torch.softmax(model(**encoding).logits, dim=-1)[:, 1].tolist()
+                for i, probability in zip(indices, probabilities):
+                    scores[i] = probability
+        return scores
+
+    def tag_batch(self, texts: List[str]) -> List[Tuple[List[str], List[Optional[str]]]]:
+        """
+        Тип ошибки для каждого слова (по первому подтокену). Слова разделяются
+        по пробелам, как в GrammarDataset; для слов за пределами GRAMMAR_TOKEN_MAX_LENGTH
+        подтокенов возвращается None.
+        """
+        import torch
+
+        tokenizer, model = self.token
+        labels = self.token_labels
+        words = [text.split() for text in texts]
+        results: List[Tuple[List[str], List[Optional[str]]]] = [([], [])] * len(texts)
+        with torch.inference_mode():
+            for indices in self._sub_batches([len(text) for text in texts]):
+                encoding = tokenizer(
+                    [words[i] for i in indices],
+                    is_split_into_words=True,
+                    padding=True,
+                    truncation=True,
+                    max_length=self.config.GRAMMAR_TOKEN_MAX_LENGTH,
+                    return_tensors='pt'
+                )
+                predictions = model(**encoding).logits.argmax(dim=-1).tolist()
+                for row, i in enumerate(indices):
+                    word_labels: List[Optional[str]] = [None] * len(words[i])
+                    for position, word_id in enumerate(encoding.word_ids(row)):
+                        if word_id is not None and word_labels[word_id] is None:
+                            word_labels[word_id] = labels[predictions[row][position]]
+                    results[i] = (words[i], word_labels)
+        return results
@@ -0,0 +1,156 @@
+import bisect
+import functools
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from app.config import settings
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Метрики в текстовом формате Prometheus без внешних зависимостей.
+    Гистограммы пишутся через observe/timer (отключаются при enabled=False),
+    мгновенные значения - через set_gauge или коллекторы, вызываемые при выдаче.
+    """
+
+    def __init__(self, enabled: bool = True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(self.buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    @contextmanager
+    def load_timer(self, model: str):
+        """Время загрузки модели (записывается всегда: событие редкое)"""
+        start = time.perf_counter()
+        yield
+        self.set_gauge('model_load_seconds', time.perf_counter() - start, model=model)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+        gauges.setdefault('process_resident_memory_bytes', {})[()] = resident_memory_bytes()
+
+        for name, series in sorted(histograms.items()):
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    bound_label = 'le="' + str(bound) + '"'
+                    lines.append(f'{name}_bucket{_format_labels(labels, bound_label)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+
+        for name, series in sorted(gauges.items()):
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in series.items():
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def resident_memory_bytes() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Вне Linux доступен только пиковый RSS (в килобайтах)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_instrumented = threading.local()
+
+
+def instrument_pipeline(pipeline, label: str):
+    """
+    Замер времени каждого процессора Stanza (обёртка process/bulk_process экземпляров).
+    bulk_process обычно вызывает process, поэтому учитывается только внешний вызов.
+    label различает пайплайны: например, tokenize общего пайплайна и пайплайна
+    для pretokenized-входа - разные по стоимости процессоры.
+    """
+    for name, processor in pipeline.processors.items():
+        for method in ('process', 'bulk_process'):
+            original = getattr(processor, method, None)
+            if original is None:
+                continue
+
+            @functools.wraps(original)
+            def timed(doc, _original=original, _name=name):
+                if getattr(_instrumented, 'active', False):
+                    return _original(doc)
+                _instrumented.active = True
+                try:
+                    with metrics.timer('stanza_processor_duration_seconds', pipeline=label, processor=_name):
+                        return _original(doc)
+                finally:
+                    _instrumented.active = False
+
+            setattr(processor, method, timed)
+    return pipeline
+
+
+metrics = Metrics(enabled=settings.METRICS_ENABLED)
@@ -0,0 +1,53 @@
+from typing import Any, Dict, Optional, Set
+
+import pymorphy2
+
+from app.utils.cache import LRUCache
+from app.utils.paradigms import ParadigmTable
+
+
+class CachedMorphAnalyzer:
+    """
+    pymorphy2.MorphAnalyzer с кэшем разборов по слову и словоформ по (лемма, граммемы).
+    Если задана таблица словоформ paradigms, inflect сначала ищет ответ в ней.
+    Остальные атрибуты делегируются исходному анализатору.
+    """
+
+    def __init__(
+            self,
+            morph: pymorphy2.MorphAnalyzer,
+            parse_cache: LRUCache,
+            inflect_cache: LRUCache,
+            paradigms: Optional[ParadigmTable] = None
+    ):
+        self._morph = morph
+        self.parse_cache = parse_cache
+        self.inflect_cache = inflect_cache
+        self.paradigms = paradigms
+
+    def parse(self, word: str) -> list:
+        return self.parse_cache.get_or_compute(word, lambda: self._morph.parse(word))
+
+    def inflect(self, lemma: str, tags: Set[str], parses: Optional[Dict[str, Any]] = None):
+        """
+        Первый разбор леммы и его словоформа с граммемами tags (None, если невозможно).
+        parses - разборы лемм, общие для нескольких вызовов (например, в пределах одного пакета):
+        они переиспользуются и при выключенном кэше разборов
+        """
+        if self.paradigms is not None:
+            found = self.paradigms.inflect(lemma, tags)
+            if found is not None:
+                return found
+
+        def compute():
+            if parses is None:
+                parsed = self.parse(lemma)[0]
+            else:
+                parsed = parses.get(lemma)
+                if parsed is None:
+                    parsed = parses[lemma] = self.parse(lemma)[0]
+            return parsed, parsed.inflect(tags)
+        return self.inflect_cache.get_or_compute((lemma, frozenset(tags)), compute)
+
+    def __getattr__(self, name):
+        return getattr(self._morph, name)
@@ -1,52 +1,490 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import numpy as np
 import stanza
 import pymorphy2
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 import logging
 
 from fastapi import HTTPException
 from gensim.models import KeyedVectors
 from starlette import status
 import gensim.downloader as api
+
+from app.utils.ann import IVFIndex
+from app.utils.batching import MicroBatcher
+from app.utils.cache import LRUCache, ResultCache, SqliteCache
+from app.utils.grammar import GrammarModels
+from app.utils.metrics import instrument_pipeline, metrics
+from app.utils.morph import CachedMorphAnalyzer
+from app.utils.paradigms import ParadigmTable
+from app.utils.vectors import load_word2vec, load_unit_vectors
 logger = logging.getLogger(__name__)
 
+PROCESSOR_ORDER = ['tokenize', 'mwt', 'pos', 'lemma', 'depparse', 'ner', 'sentiment', 'constituency']
+PROCESSOR_REQUIREMENTS = {
+    'lemma': ['pos'],
+    'depparse': ['pos', 'lemma'],
+}
+
 
 class NLPModels:
     def __init__(self, config):
-        self._pipelines: Dict[str, stanza.Pipeline] = {}
-        self.morph = pymorphy2.MorphAnalyzer()
-        self.word2Vec =  KeyedVectors.load_word2vec_format('/home/roman/projects/mag/py/StanzaHttpWrapper/models/word_vectors.w2v')
+        self._pipelines: Dict[str, Callable] = {}
+        self._shared_pipeline: Optional[SerializedPipeline] = None
+        self._pretokenizer: Optional[SerializedPipeline] = None
+        self._batchers: Dict[str, MicroBatcher] = {}
+        # Загрузка каждого пайплайна под своим замком: конкурентные первые запросы не строят его дважды
+        self._pipeline_locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._shared_lock = threading.Lock()
+        self.ready = False
+        self.warmup_status: Dict[str, str] = {}
+        self.morph = CachedMorphAnalyzer(
+            pymorphy2.MorphAnalyzer(),
+            parse_cache=LRUCache(config.MORPH_PARSE_CACHE_SIZE, config.MORPH_CACHE_POLICY),
+            inflect_cache=LRUCache(config.MORPH_INFLECT_CACHE_SIZE, config.MORPH_CACHE_POLICY),
+            paradigms=self._load_paradigms(config.MORPH_PARADIGMS_PATH)
+        )
+        self._word2vec: Optional[KeyedVectors] = None
+        self._word2vec_unit: Optional[np.ndarray] = None
+        self._ann_index: Optional[IVFIndex] = None
+        self.ann_error: Optional[str] = None
+        self._word2vec_lock = threading.Lock()
         self.config = config
 
-    def get_pipeline(self, name: str) -> Optional[stanza.Pipeline]:
+        # Пул для CPU-нагрузки: модели вызываются вне event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.NLP_WORKERS or os.cpu_count(),
+            thread_name_prefix='nlp'
+        )
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._active = 0
+
+        self.grammar = GrammarModels(config, executor=self._executor)
+
+        # Кэш результатов Stanza: LRU в памяти и необязательный sqlite на диске
+        self.result_cache = ResultCache(
+            LRUCache(config.STANZA_RESULT_CACHE_SIZE),
+            SqliteCache(config.STANZA_RESULT_CACHE_PATH, self.models_version)
+            if config.STANZA_RESULT_CACHE_PATH else None
+        )
+        metrics.register_collector(self.collect_metrics)
+
+    @staticmethod
+    def _load_paradigms(path: str) -> Optional[ParadigmTable]:
+        if not os.path.isdir(path):
+            return None
+        with metrics.load_timer('paradigms'):
+            table = ParadigmTable.load(path)
+        logger.info(f"Loaded paradigm table: {len(table)} lemmas")
+        return table
+
+    @property
+    def models_version(self) -> str:
+        return f"stanza-{stanza.__version__}:{self.config.STANZA_MODELS_VERSION}"
+
+    def result_key(
+            self,
+            name: str,
+            text: str,
+            processors: Optional[List[str]] = None,
+            pretokenized: bool = False
+    ) -> str:
+        """Ключ кэша: имя пайплайна, процессоры, версия моделей и хэш текста"""
+        processors = processors or self.config.STANZA_MODELS.get(name, [])
+        if pretokenized:
+            name = f"{name}:pretokenized"
+        payload = '\x1f'.join([name, ','.join(processors), self.models_version, text])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @property
+    def word2Vec(self) -> KeyedVectors:
+        """Векторы загружаются при первом обращении (mmap, см. app.utils.vectors)"""
+        if self._word2vec is None:
+            with self._word2vec_lock:
+                if self._word2vec is None:
+                    with metrics.load_timer('word2vec'):
+                        self._word2vec = load_word2vec(
+                            self.config.WORD2VEC_PATH,
+                            self.config.WORD2VEC_MMAP_PATH
+                        )
+        return self._word2vec
+
+    @property
+    def word2vec_unit(self) -> np.ndarray:
+        """Нормированная матрица векторов в порядке word2Vec.index_to_key"""
+        if self._word2vec_unit is None:
+            vectors = self.word2Vec
+            with self._word2vec_lock:
+                if self._word2vec_unit is None:
+                    with metrics.load_timer('word2vec_unit'):
+                        self._word2vec_unit = load_unit_vectors(vectors, self.config.WORD2VEC_MMAP_PATH)
+        return self._word2vec_unit
+
+    @property
+    def ann_index(self) -> Optional[IVFIndex]:
+        """
+        IVF-индекс ближайших соседей, если он был построен офлайн.
+        Индекс, который не удалось загрузить (повреждён или построен по другому словарю word2vec),
+        даёт ValueError; ошибка запоминается в ann_error, и загрузка до перезапуска не повторяется
+        """
+        if self._ann_index is None and self.ann_error is None and os.path.isdir(self.config.ANN_INDEX_PATH):
+            keys = self.word2Vec.index_to_key
+            with self._word2vec_lock:
+                if self._ann_index is None and self.ann_error is None:
+                    try:
+                        with metrics.load_timer('ann_index'):
+                            self._ann_index = IVFIndex.load(self.config.ANN_INDEX_PATH, keys)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"ANN index load error: {str(e)}")
+                        self.ann_error = str(e)
+        if self.ann_error is not None:
+            raise ValueError(self.ann_error)
+        return self._ann_index
+
+    @asynccontextmanager
+    async def limit(self):
+        """Ограничение числа одновременно обрабатываемых и ожидающих запросов"""
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.config.NLP_MAX_IN_FLIGHT)
+        if self._waiting >= self.config.NLP_MAX_QUEUE:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервис перегружен, повторите запрос позже"
+            )
+        self._waiting += 1
         try:
-            if name not in self._pipelines:
-                processors = self.config.STANZA_MODELS.get(name)
+            await self._in_flight.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._in_flight.release()
+
+    def collect_metrics(self):
+        """Мгновенные значения для /api/v1/service/metrics: очереди, загрузка пула, кэши"""
+        yield 'nlp_waiting_requests', {}, self._waiting
+        yield 'nlp_in_flight_requests', {}, self._active
+        for key, batcher in self._batchers.items():
+            yield 'batch_queue_depth', {'pipeline': key}, batcher.depth
+        yield 'batch_queue_depth', {'pipeline': 'grammar_score'}, self.grammar.score_batcher.depth
+        yield 'batch_queue_depth', {'pipeline': 'grammar_tag'}, self.grammar.tag_batcher.depth
+
+        caches = {
+            'morph_parse': self.morph.parse_cache,
+            'morph_inflect': self.morph.inflect_cache,
+            'stanza_results_memory': self.result_cache.memory,
+            'stanza_results_disk': self.result_cache.disk
+        }
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            yield 'cache_hits', {'cache': name}, cache.hits
+            yield 'cache_misses', {'cache': name}, cache.misses
+            total = cache.hits + cache.misses
+            yield 'cache_hit_rate', {'cache': name}, cache.hits / total if total else 0.0
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнение синхронного вызова модели в пуле потоков"""
+        async with self.limit():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def process(
+            self,
+            name: str,
+            text,
+            pretokenized: bool = False,
+            processors: Optional[List[str]] = None
+    ) -> stanza.Document:
+        """Обработка текста; при pretokenized text - список предложений из токенов"""
+        return self.get_pipeline(name, pretokenized, processors)(text)
+
+    def resolve_processors(self, processors: List[str]) -> List[str]:
+        """Дополнение запрошенных процессоров зависимостями и приведение к порядку Stanza"""
+        available = {p for model in self.config.STANZA_MODELS.values() for p in model}
+        requested = {'tokenize'}
+        for processor in processors:
+            if processor not in available:
+                raise ValueError(f"Unknown processor: {processor}")
+            requested.add(processor)
+            requested.update(PROCESSOR_REQUIREMENTS.get(processor, []))
+        return [processor for processor in PROCESSOR_ORDER if processor in requested]
+
+    def get_pipeline(
+            self,
+            name: str,
+            pretokenized: bool = False,
+            processors: Optional[List[str]] = None
+    ):
+        """
+        Пайплайн по имени из STANZA_MODELS либо по явному списку процессоров.
+        В режиме STANZA_SHARED_PIPELINE возвращается представление общего пайплайна,
+        в котором каждый процессор загружен один раз.
+        """
+        if processors:
+            processors = self.resolve_processors(processors)
+            name = ','.join(processors)
+        key = f"{name}:pretokenized" if pretokenized else name
+        pipeline = self._pipelines.get(key)
+        if pipeline is not None:
+            return pipeline
+        try:
+            with self._pipeline_lock(key):
+                if key in self._pipelines:
+                    return self._pipelines[key]
+                processors = processors or self.config.STANZA_MODELS.get(name)
                 if not processors:
                     raise ValueError(f"Unknown pipeline: {name}")
 
-                self._pipelines[name] = stanza.Pipeline(
-                    lang='ru',
-                    processors=','.join(processors),
-                    logging_level='WARN'
-                )
-            return self._pipelines[name]
+                if self.config.STANZA_SHARED_PIPELINE:
+                    self._pipelines[key] = PipelineView(
+                        self._get_shared_pipeline(),
+                        processors,
+                        tokenizer=self._get_pretokenizer() if pretokenized else None
+                    )
+                else:
+                    with metrics.load_timer(key):
+                        self._pipelines[key] = SerializedPipeline(instrument_pipeline(stanza.Pipeline(
+                            lang='ru',
+                            processors=','.join(processors),
+                            tokenize_pretokenized=pretokenized,
+                            logging_level='WARN'
+                        ), key))
+            return self._pipelines[key]
         except Exception as e:
             logger.error(f"Pipeline {name} init error: {str(e)}")
             raise
 
+    def _pipeline_lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._pipeline_locks.setdefault(key, threading.Lock())
+
+    def _get_shared_pipeline(self) -> 'SerializedPipeline':
+        if self._shared_pipeline is None:
+            with self._shared_lock:
+                if self._shared_pipeline is None:
+                    processors = self.resolve_processors(
+                        [p for processors in self.config.STANZA_MODELS.values() for p in processors]
+                    )
+                    with metrics.load_timer('shared'):
+                        self._shared_pipeline = SerializedPipeline(instrument_pipeline(stanza.Pipeline(
+                            lang='ru',
+                            processors=','.join(processors),
+                            logging_level='WARN'
+                        ), 'shared'))
+        return self._shared_pipeline
+
+    def _get_pretokenizer(self) -> 'SerializedPipeline':
+        # В режиме pretokenized токенизатор не загружает нейросеть
+        if self._pretokenizer is None:
+            with self._pipeline_lock('pretokenizer'):
+                if self._pretokenizer is None:
+                    with metrics.load_timer('pretokenizer'):
+                        self._pretokenizer = SerializedPipeline(instrument_pipeline(stanza.Pipeline(
+                            lang='ru',
+                            processors='tokenize',
+                            tokenize_pretokenized=True,
+                            logging_level='WARN'
+                        ), 'pretokenized'))
+        return self._pretokenizer
+
+    def _warm_up_model(self, name: str):
+        """Загрузка одной модели профиля и пробный вызов для выделения буферов"""
+        text = self.config.WARMUP_TEXT
+        if name in self.config.STANZA_MODELS:
+            self.process(name, text)
+            self.process(name, [text.split()], pretokenized=True)
+        elif name == 'morph':
+            for word in text.split():
+                self.morph.parse(word)
+        elif name == 'word2vec':
+            self.word2vec_unit
+        elif name == 'ann':
+            if self.ann_index is None:
+                raise FileNotFoundError(self.config.ANN_INDEX_PATH)
+            # /semantic/neighbours возвращает слова из word2vec: ключи и матрица нужны вместе с индексом
+            self.word2vec_unit
+        elif name == 'grammar_binary':
+            self.grammar.score_batch([text])
+        elif name == 'grammar_token':
+            self.grammar.tag_batch([text])
+        else:
+            raise ValueError(f"Unknown warm-up model: {name}")
+
+    def warm_up(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Параллельная загрузка моделей профиля WARMUP_MODELS с пробным вызовом.
+        Ошибка одной модели не останавливает остальные, но сервис считается готовым,
+        только если все модели профиля загружены.
+        Готовый индекс ANN_INDEX_PATH загружается при старте и без 'ann' в профиле;
+        такая загрузка видна в warmup_status, но на готовность не влияет.
+        """
+        required = list(self.config.WARMUP_MODELS) if names is None else list(names)
+        names = list(required)
+        if 'ann' not in names and os.path.isdir(self.config.ANN_INDEX_PATH):
+            logger.info(f"ANN index found at {self.config.ANN_INDEX_PATH}, loading it during warm-up")
+            names.append('ann')
+        self.warmup_status = {name: 'loading' for name in names}
+        with ThreadPoolExecutor(max_workers=max(1, self.config.WARMUP_WORKERS), thread_name_prefix='warmup') as pool:
+            futures = {name: pool.submit(self._warm_up_model, name) for name in names}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                    self.warmup_status[name] = 'ready'
+                except Exception as e:
+                    logger.error(f"Warm-up of {name} failed: {str(e)}")
+                    self.warmup_status[name] = 'failed'
+        self.ready = all(self.warmup_status[name] == 'ready' for name in required)
+        logger.info(f"Warm-up finished: {self.warmup_status}")
+        return self.warmup_status
 
-def process_stanza_pipeline(
+    def get_batcher(self, name: str, processors: Optional[List[str]] = None) -> MicroBatcher:
+        """Очередь, объединяющая конкурентные запросы к пайплайну в один многодокументный вызов"""
+        key = ','.join(processors) if processors else name
+        if key not in self._batchers:
+            self._batchers[key] = MicroBatcher(
+                lambda texts: self.process_documents(name, texts, processors),
+                window_ms=self.config.STANZA_BATCH_WINDOW_MS,
+                max_size=self.config.STANZA_BATCH_MAX_SIZE,
+                executor=self._executor
+            )
+        return self._batchers[key]
+
+    def process_documents(self, name: str, texts: List[str], processors: Optional[List[str]] = None) -> List[dict]:
+        """
+        Один многодокументный вызов пайплайна; результаты сохраняются в кэш.
+        Вызывающий уже проверил кэш в памяти, здесь (в пуле) проверяется только диск.
+        """
+        keys = [self.result_key(name, text, processors) for text in texts]
+        results = [self.result_cache.get_disk(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            pipeline = self.get_pipeline(name, processors=processors)
+            docs = pipeline([stanza.Document([], text=texts[i]) for i in missing])
+            for i, doc in zip(missing, docs):
+                results[i] = doc.to_dict()
+                self.result_cache.put(keys[i], results[i])
+        return results
+
+    def process_pretokenized_cached(
+            self,
+            name: str,
+            tokens: List[List[str]],
+            key: str,
+            processors: Optional[List[str]] = None
+    ) -> list:
+        """Разметка токенизированного текста с проверкой и пополнением кэша (выполняется в пуле)"""
+        result = self.result_cache.get_disk(key)
+        if result is None:
+            result = self.process(name, tokens, pretokenized=True, processors=processors).to_dict()
+            self.result_cache.put(key, result)
+        return result
+
+
+class SerializedPipeline:
+    """
+    Пайплайн Stanza, вызываемый не более чем одним потоком одновременно.
+    Stanza не гарантирует потокобезопасность, а один объект вызывают и микробатчеры,
+    и прямые models.run(...) из пула NLP_WORKERS. В режиме STANZA_SHARED_PIPELINE
+    все именованные пайплайны - представления одного объекта и ждут одного замка
+    """
+
+    def __init__(self, pipeline: stanza.Pipeline):
+        self.pipeline = pipeline
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.pipeline(*args, **kwargs)
+
+
+class PipelineView:
+    """Именованное подмножество процессоров общего пайплайна"""
+
+    def __init__(
+            self,
+            pipeline: SerializedPipeline,
+            processors: List[str],
+            tokenizer: Optional[SerializedPipeline] = None
+    ):
+        self.pipeline = pipeline
+        self.processors = processors
+        self.tokenizer = tokenizer
+
+    def __call__(self, doc):
+        if self.tokenizer is not None:
+            doc = self.tokenizer(doc)
+            return self.pipeline(doc, processors=[p for p in self.processors if p != 'tokenize'])
+        return self.pipeline(doc, processors=self.processors)
+
+
+async def process_stanza_pipeline_pretokenized(
+        pipeline_name: str,
+        tokens: List[List[str]],
+        models: NLPModels,
+        processors: Optional[List[str]] = None
+):
+    """Обработка уже токенизированного текста: нейросетевой токенизатор Stanza не вызывается"""
+    if processors:
+        try:
+            processors = models.resolve_processors(processors)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    key = models.result_key(pipeline_name, json.dumps(tokens, ensure_ascii=False), processors, pretokenized=True)
+    # В event loop - только кэш в памяти; диск проверяется в пуле
+    result = models.result_cache.get_memory(key)
+    if result is not None:
+        return result
+    if not any(tokens):
+        return []
+    try:
+        return await models.run(models.process_pretokenized_cached, pipeline_name, tokens, key, processors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Stanza processing error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка обработки текста"
+        )
+
+
+async def process_stanza_pipeline_batched(
         pipeline_name: str,
         text: str,
-        models: NLPModels
+        models: NLPModels,
+        processors: Optional[List[str]] = None
 ):
+    if processors:
+        try:
+            processors = models.resolve_processors(processors)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # В event loop - только кэш в памяти; диск проверяется в пуле (process_documents)
+    result = models.result_cache.get_memory(models.result_key(pipeline_name, text, processors))
+    if result is not None:
+        return result
     try:
-        pipeline = models.get_pipeline(pipeline_name)
-        doc = pipeline(text)
-        return doc.to_dict()
+        async with models.limit():
+            return await models.get_batcher(pipeline_name, processors).submit(text)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Stanza processing error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка обработки текста"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,317 @@
+import argparse
+import bisect
+import json
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Измерения, которые запрашивает генератор (см. map_tags_to_pymorphy), и их коды в битовой маске.
+# Код 0 - измерение не задано
+DIMENSIONS = [
+    ('case', 3, ['nomn', 'gent', 'datv', 'accs', 'ablt', 'loct']),
+    ('number', 2, ['sing', 'plur']),
+    ('gender', 2, ['masc', 'femn', 'neut']),
+    ('tense', 2, ['past', 'pres', 'futr']),
+    ('person', 2, ['1per', '2per', '3per']),
+    ('voice', 2, ['actv', 'pssv']),
+]
+
+# Редкие падежи pymorphy2 сводятся к основным, как это делает Parse.inflect
+RARE_CASES = {'gen1': 'gent', 'gen2': 'gent', 'acc2': 'accs', 'loc1': 'loct', 'loc2': 'loct', 'voct': 'nomn'}
+
+_GRAMMEMES = {}
+_shift = 0
+for _name, _bits, _values in DIMENSIONS:
+    for _code, _value in enumerate(_values, start=1):
+        _GRAMMEMES[_value] = (_shift, (1 << _bits) - 1, _code)
+    _shift += _bits
+
+ParadigmParse = namedtuple('ParadigmParse', ['normal_form', 'tag'])
+ParadigmForm = namedtuple('ParadigmForm', ['word'])
+
+
+def pack_tags(tags: Iterable[str]) -> Optional[int]:
+    """Битовая маска набора граммем; None, если граммема вне DIMENSIONS или измерение задано дважды"""
+    mask = 0
+    for tag in tags:
+        if tag not in _GRAMMEMES:
+            return None
+        shift, width, code = _GRAMMEMES[tag]
+        if mask >> shift & width:
+            return None
+        mask |= code << shift
+    return mask
+
+
+def unpack_mask(mask: int) -> Set[str]:
+    tags = set()
+    shift = 0
+    for _, bits, values in DIMENSIONS:
+        code = mask >> shift & ((1 << bits) - 1)
+        if code:
+            tags.add(values[code - 1])
+        shift += bits
+    return tags
+
+
+def _form_mask(tag) -> int:
+    grammemes = []
+    for name, _, _ in DIMENSIONS:
+        value = getattr(tag, name)
+        if value is not None:
+            grammemes.append(RARE_CASES.get(value, value))
+    return pack_tags(g for g in grammemes if g in _GRAMMEMES) or 0
+
+
+def _sub_masks(mask: int) -> List[int]:
+    """Все маски, в которых каждое измерение либо совпадает с mask, либо не задано"""
+    parts = []
+    shift = 0
+    for _, bits, _ in DIMENSIONS:
+        code = mask >> shift & ((1 << bits) - 1)
+        if code:
+            parts.append(code << shift)
+        shift += bits
+    result = [0]
+    for part in parts:
+        result += [m | part for m in result]
+    return result[1:]
+
+
+class _StringTable:
+    """Строки в одном байтовом массиве со смещениями (подходит для mmap)"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        # Индексация memoryview на порядок дешевле, чем скаляров numpy
+        self._data = memoryview(data) if len(data) else memoryview(b'')
+        self._offsets = memoryview(offsets)
+
+    @classmethod
+    def build(cls, strings: List[str]) -> '_StringTable':
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode('utf-8')
+
+
+class ParadigmTable:
+    """
+    Предвычисленные словоформы: лемма -> отсортированный массив (битовая маска граммем, словоформа).
+
+    Строится офлайн вызовом того же parse(lemma)[0].inflect(tags), что и /morph/inflect,
+    для всех масок, которые могут дать словоформу, поэтому результаты совпадают.
+    Леммы отсортированы по байтам UTF-8 и ищутся двоичным поиском, все массивы
+    открываются через mmap. Отсутствие леммы или маски означает "спросить pymorphy2".
+    """
+
+    ARRAYS = (
+        'lemma_data', 'lemma_offsets', 'form_data', 'form_offsets',
+        'normal_ids', 'tag_ids', 'entry_offsets', 'masks', 'form_ids'
+    )
+
+    def __init__(
+            self,
+            lemmas: _StringTable,
+            forms: _StringTable,
+            normal_ids: np.ndarray,
+            tag_ids: np.ndarray,
+            entry_offsets: np.ndarray,
+            masks: np.ndarray,
+            form_ids: np.ndarray,
+            tags: List[str]
+    ):
+        self.lemmas = lemmas
+        self.forms = forms
+        self.normal_ids = normal_ids
+        self.tag_ids = tag_ids
+        self.entry_offsets = entry_offsets
+        self.masks = masks
+        self.form_ids = form_ids
+        self.tags = tags
+        self._normal_ids = memoryview(normal_ids)
+        self._tag_ids = memoryview(tag_ids)
+        self._entry_offsets = memoryview(entry_offsets)
+        self._masks = memoryview(masks) if len(masks) else memoryview(b'').cast('H')
+        self._form_ids = memoryview(form_ids)
+
+    def __len__(self) -> int:
+        return len(self.lemmas)
+
+    def _find(self, lemma: str) -> int:
+        key = lemma.lower().encode('utf-8')
+        lo, hi = 0, len(self.lemmas)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.lemmas.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.lemmas) and self.lemmas.raw(lo) == key:
+            return lo
+        return -1
+
+    def inflect(self, lemma: str, tags: Set[str]) -> Optional[Tuple[ParadigmParse, ParadigmForm]]:
+        """Разбор леммы и словоформа с граммемами tags или None, если таблица не знает ответа"""
+        mask = pack_tags(tags)
+        if not mask:
+            return None
+        row = self._find(lemma)
+        if row < 0:
+            return None
+        start, end = self._entry_offsets[row], self._entry_offsets[row + 1]
+        pos = bisect.bisect_left(self._masks, mask, start, end)
+        if pos == end or self._masks[pos] != mask:
+            return None
+        parsed = ParadigmParse(self.forms[self._normal_ids[row]], self.tags[self._tag_ids[row]])
+        return parsed, ParadigmForm(self.forms[self._form_ids[pos]])
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, str, str, List[Tuple[int, str]]]]) -> 'ParadigmTable':
+        """rows: (лемма, нормальная форма, тег разбора, [(маска, словоформа)]) в любом порядке"""
+        rows = sorted(rows, key=lambda row: row[0].encode('utf-8'))
+        forms, form_index = [], {}
+        tags, tag_index = [], {}
+
+        def intern(value: str, values: list, index: dict) -> int:
+            if value not in index:
+                index[value] = len(values)
+                values.append(value)
+            return index[value]
+
+        normal_ids = np.empty(len(rows), dtype=np.int32)
+        tag_ids = np.empty(len(rows), dtype=np.int32)
+        entry_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        masks, form_ids = [], []
+        for i, (_, normal_form, tag, entries) in enumerate(rows):
+            normal_ids[i] = intern(normal_form, forms, form_index)
+            tag_ids[i] = intern(tag, tags, tag_index)
+            for mask, word in sorted(entries):
+                masks.append(mask)
+                form_ids.append(intern(word, forms, form_index))
+            entry_offsets[i + 1] = len(masks)
+
+        return cls(
+            _StringTable.build([row[0] for row in rows]),
+            _StringTable.build(forms),
+            normal_ids,
+            tag_ids,
+            entry_offsets,
+            np.array(masks, dtype=np.uint16),
+            np.array(form_ids, dtype=np.int32),
+            tags
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            'lemma_data': self.lemmas.data,
+            'lemma_offsets': self.lemmas.offsets,
+            'form_data': self.forms.data,
+            'form_offsets': self.forms.offsets,
+            'normal_ids': self.normal_ids,
+            'tag_ids': self.tag_ids,
+            'entry_offsets': self.entry_offsets,
+            'masks': self.masks,
+            'form_ids': self.form_ids,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), array)
+        with open(os.path.join(path, 'tags.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.tags, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'ParadigmTable':
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in cls.ARRAYS
+        }
+        with open(os.path.join(path, 'tags.json'), encoding='utf-8') as f:
+            tags = json.load(f)
+        return cls(
+            _StringTable(arrays['lemma_data'], arrays['lemma_offsets']),
+            _StringTable(arrays['form_data'], arrays['form_offsets']),
+            arrays['normal_ids'],
+            arrays['tag_ids'],
+            arrays['entry_offsets'],
+            arrays['masks'],
+            arrays['form_ids'],
+            tags
+        )
+
+
+_morph = None
+
+
+def _init_worker():
+    global _morph
+    import pymorphy2
+
+    _morph = pymorphy2.MorphAnalyzer()
+
+
+def _paradigm_row(lemma: str) -> Tuple[str, str, str, List[Tuple[int, str]]]:
+    parsed = _morph.parse(lemma)[0]
+    candidates = set()
+    for form in parsed.lexeme:
+        candidates.update(_sub_masks(_form_mask(form.tag)))
+    entries = []
+    for mask in sorted(candidates):
+        inflected = parsed.inflect(unpack_mask(mask))
+        if inflected:
+            entries.append((mask, inflected.word))
+    return lemma, parsed.normal_form, str(parsed.tag), entries
+
+
+def dictionary_lemmas(pos: Optional[List[str]] = None) -> List[str]:
+    """Нормальные формы словаря pymorphy2 (в нижнем регистре, как их ищет ParadigmTable)"""
+    if _morph is None:
+        _init_worker()
+    lemmas = set()
+    for word, tag, _, _, index in _morph.dictionary.iter_known_words():
+        if index == 0 and (not pos or tag.POS in pos):
+            lemmas.add(word)
+    return sorted(lemmas)
+
+
+def build_table(lemmas: List[str], workers: int = 1) -> ParadigmTable:
+    if workers <= 1:
+        if _morph is None:
+            _init_worker()
+        return ParadigmTable.build(map(_paradigm_row, lemmas))
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=workers, initializer=_init_worker) as pool:
+        return ParadigmTable.build(pool.imap_unordered(_paradigm_row, lemmas, chunksize=256))
+
+
+if __name__ == '__main__':
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Построение таблицы словоформ для /morph/inflect из словаря pymorphy2")
+    parser.add_argument('--output', default=settings.MORPH_PARADIGMS_PATH)
+    parser.add_argument('--pos', default='', help="Части речи OpenCorpora через запятую (по умолчанию все)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    lemmas = dictionary_lemmas([p for p in args.pos.split(',') if p] or None)
+    logger.info(f"Building paradigm table for {len(lemmas)} lemmas")
+    table = build_table(lemmas, workers=args.workers)
+    table.save(args.output)
+    logger.info(f"{len(table)} lemmas, {len(table.masks)} forms saved to {args.output}")
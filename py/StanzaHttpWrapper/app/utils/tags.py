@@ -1,36 +1,207 @@
-from typing import Optional, Dict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
 
 from app.config import settings
 
+PYMORPHY_FEATURES = ('Case', 'Number', 'Gender', 'Tense', 'Person', 'Voice')
+GENDERS = frozenset({'masc', 'femn', 'neut'})
+
+# Признаки токена в виде плоского кортежа кодов: (имя, значение, имя, значение, ...)
+Codes = Tuple[int, ...]
+
+# Словарь универсальных признаков UD (https://universaldependencies.org/u/feat/), который выдаёт Stanza.
+# Коды получают только эти имена и значения (и значения TAG_MAPPING): строки от клиентов
+# с другими признаками разбираются без кэширования и не расширяют таблицы кодека
+UD_FEATURES = {
+    'Abbr': ['Yes'],
+    'Animacy': ['Anim', 'Inan', 'Hum', 'Nhum'],
+    'Aspect': ['Imp', 'Perf', 'Hab', 'Iter', 'Prog', 'Prosp'],
+    'Case': ['Nom', 'Gen', 'Dat', 'Acc', 'Ins', 'Loc', 'Par', 'Voc', 'Abl', 'Abs', 'Erg'],
+    'Definite': ['Def', 'Ind', 'Spec', 'Cons', 'Com'],
+    'Degree': ['Pos', 'Cmp', 'Sup', 'Abs', 'Equ'],
+    'Evident': ['Fh', 'Nfh'],
+    'Foreign': ['Yes'],
+    'Gender': ['Masc', 'Fem', 'Neut', 'Com'],
+    'Mood': ['Ind', 'Imp', 'Cnd', 'Sub', 'Opt', 'Pot', 'Qot'],
+    'NumType': ['Card', 'Ord', 'Mult', 'Frac', 'Sets', 'Dist', 'Range'],
+    'Number': ['Sing', 'Plur', 'Dual', 'Coll', 'Ptan'],
+    'Person': ['0', '1', '2', '3', '4'],
+    'Polarity': ['Pos', 'Neg'],
+    'Polite': ['Infm', 'Form', 'Elev', 'Humb'],
+    'Poss': ['Yes'],
+    'PronType': ['Prs', 'Rcp', 'Art', 'Int', 'Rel', 'Exc', 'Dem', 'Emp', 'Tot', 'Neg', 'Ind'],
+    'Reflex': ['Yes'],
+    'Tense': ['Past', 'Pres', 'Fut', 'Imp', 'Pqp'],
+    'Typo': ['Yes'],
+    'Variant': ['Short', 'Long'],
+    'VerbForm': ['Fin', 'Inf', 'Part', 'Conv', 'Ger', 'Sup', 'Vnoun'],
+    'Voice': ['Act', 'Pass', 'Mid', 'Antip', 'Cau', 'Rcp'],
+}
+
+
+class FeatureBatch:
+    """
+    Признаки всех токенов предложения: для каждого токена - номер в списке
+    различных наборов кодов (в предложении их обычно намного меньше, чем токенов).
+    Строка feats с признаками вне словаря кодека хранится в distinct как есть.
+    """
+
+    def __init__(self, codec: 'FeatureCodec', ids: List[int], distinct: List[Union[Codes, str]]):
+        self.codec = codec
+        self.ids = ids
+        self.distinct = distinct
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def to_dicts(self) -> List[Dict[str, str]]:
+        """Словари признаков по токенам; одинаковые наборы - один и тот же объект, изменять нельзя"""
+        dicts = [
+            self.codec.decode_cached(codes) if isinstance(codes, tuple) else self.codec.parse(codes)
+            for codes in self.distinct
+        ]
+        return [dicts[i] for i in self.ids]
+
+
+class FeatureCodec:
+    """
+    Целые коды для имён и значений UD-признаков из фиксированного словаря
+    (UD_FEATURES и значения TAG_MAPPING); таблицы кодов после создания не меняются.
+    Разбор каждой различной строки feats ('Case=Nom|Number=Sing') и отображение
+    набора кодов в граммемы pymorphy2 выполняются один раз и кэшируются.
+    Строки с признаками вне словаря разбираются при каждом вызове и в кэш не попадают.
+    Число сочетаний известных признаков тоже может быть велико, поэтому кэши
+    перестают пополняться после max_cached записей.
+    """
+
+    def __init__(
+            self,
+            tag_mapping: Dict[str, str],
+            features: Dict[str, List[str]] = UD_FEATURES,
+            max_cached: int = 100000
+    ):
+        self.tag_mapping = tag_mapping
+        self.max_cached = max_cached
+        self.names: List[str] = list(features)
+        self.values: List[str] = list(dict.fromkeys(
+            [value for values in features.values() for value in values] + list(tag_mapping)
+        ))
+        self._name_codes: Dict[str, int] = {name: code for code, name in enumerate(self.names)}
+        self._value_codes: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+        self._encoded: Dict[str, Codes] = {}
+        self._decoded: Dict[Codes, Dict[str, str]] = {}
+        self._pymorphy: Dict[Codes, FrozenSet[str]] = {}
+
+    def _remember(self, cache: dict, key, value):
+        if len(cache) < self.max_cached:
+            cache[key] = value
+        return value
+
+    @staticmethod
+    def _split(feats: str) -> List[Tuple[str, str]]:
+        pairs = []
+        for feat in feats.split('|'):
+            if '=' in feat:
+                key, value = feat.split('=', 1)
+                pairs.append((key.strip(), value.strip()))
+        return pairs
+
+    def _encode_pairs(self, pairs: Iterable[Tuple[str, str]]) -> Optional[Codes]:
+        codes = []
+        for key, value in pairs:
+            name_code = self._name_codes.get(key)
+            value_code = self._value_codes.get(value)
+            if name_code is None or value_code is None:
+                return None
+            codes.append(name_code)
+            codes.append(value_code)
+        return tuple(codes)
+
+    def parse(self, feats: Optional[str]) -> Dict[str, str]:
+        """Разбор строки feats в новый словарь, без кодов и кэша"""
+        if not feats or feats == '_':
+            return {}
+        return dict(self._split(feats))
+
+    def encode(self, feats: Optional[str]) -> Optional[Codes]:
+        """Коды признаков строки feats (пустой кортеж для None и '_'); None, если есть признаки вне словаря"""
+        if not feats or feats == '_':
+            return ()
+        codes = self._encoded.get(feats)
+        if codes is not None:
+            return codes
+        codes = self._encode_pairs(self._split(feats))
+        if codes is None:
+            return None
+        return self._remember(self._encoded, feats, codes)
+
+    def encode_features(self, features: Dict[str, str]) -> Optional[Codes]:
+        return self._encode_pairs(features.items())
+
+    def decode(self, codes: Codes) -> Dict[str, str]:
+        return {self.names[codes[i]]: self.values[codes[i + 1]] for i in range(0, len(codes), 2)}
+
+    def decode_cached(self, codes: Codes) -> Dict[str, str]:
+        """Как decode, но возвращает общий закэшированный словарь - изменять его нельзя"""
+        features = self._decoded.get(codes)
+        if features is None:
+            features = self._remember(self._decoded, codes, self.decode(codes))
+        return features
+
+    def features(self, feats: Optional[str]) -> Dict[str, str]:
+        """Словарь признаков строки feats из кэша (изменять нельзя)"""
+        codes = self.encode(feats)
+        if codes is None:
+            return self.parse(feats)
+        return self.decode_cached(codes)
+
+    def encode_batch(self, feats_list: List[Optional[str]]) -> FeatureBatch:
+        """Признаки всех токенов предложения одним вызовом"""
+        index: Dict[Union[Codes, str], int] = {}
+        ids = []
+        for feats in feats_list:
+            codes = self.encode(feats)
+            key = feats if codes is None else codes
+            ids.append(index.setdefault(key, len(index)))
+        return FeatureBatch(self, ids, list(index))
+
+    def pymorphy_tags(self, codes: Codes) -> FrozenSet[str]:
+        """Граммемы pymorphy2 для набора кодов (результат кэшируется)"""
+        tags = self._pymorphy.get(codes)
+        if tags is not None:
+            return tags
+        pairs = [(self.names[codes[i]], self.values[codes[i + 1]]) for i in range(0, len(codes), 2)]
+        return self._remember(self._pymorphy, codes, self.map_pairs(pairs))
+
+    def map_pairs(self, pairs: Iterable[Tuple[str, str]]) -> FrozenSet[str]:
+        """Граммемы pymorphy2 для пар (признак, значение); при Number=Plur род отбрасывается"""
+        result = set()
+        is_plural = False
+        for key, value in pairs:
+            if key in PYMORPHY_FEATURES:
+                if key == 'Number' and value == 'Plur':
+                    is_plural = True
+                if value in self.tag_mapping:
+                    result.add(self.tag_mapping[value])
+        if is_plural:
+            result -= GENDERS
+        return frozenset(result)
+
+
+feature_codec = FeatureCodec(settings.TAG_MAPPING)
+
+
 def parse_features(
     features: Optional[Dict[str, str]],
     features_str: Optional[str]
 ) -> Dict[str, str]:
-    result = {}
-    if features_str:
-        for item in features_str.split('|'):
-            if '=' in item:
-                key, value = item.split('=', 1)
-                result[key.strip()] = value.strip()
+    result = dict(feature_codec.features(features_str))
     if features:
         result.update(features)
     return result
 
 
-def map_tags_to_pymorphy(features: Dict[str, str]) -> set:
-    pymorphy_tags = set()
-
-    is_plural = False
-
-    for key, value in features.items():
-        if key in ['Case', 'Number', 'Gender', 'Tense', 'Person', 'Voice']:
-            if key == 'Number' and value == 'Plur':
-                is_plural = True
-
-            if value in settings.TAG_MAPPING:
-                pymorphy_tags.add(settings.TAG_MAPPING[value])
-
-    if is_plural:
-        pymorphy_tags = {tag for tag in pymorphy_tags if tag not in {'masc', 'femn', 'neut'}}
-
-    return pymorphy_tags
\ No newline at end of file
+def map_tags_to_pymorphy(features: Dict[str, str]) -> FrozenSet[str]:
+    codes = feature_codec.encode_features(features)
+    if codes is None:
+        return feature_codec.map_pairs(features.items())
+    return feature_codec.pymorphy_tags(codes)
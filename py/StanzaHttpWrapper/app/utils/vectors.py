@@ -0,0 +1,75 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+from gensim.models import KeyedVectors
+
+logger = logging.getLogger(__name__)
+
+
+def _is_stale(path: str, source: str) -> bool:
+    """Файла нет или он старше source (отсутствующий source не делает его устаревшим)"""
+    if not os.path.exists(path):
+        return True
+    return os.path.exists(source) and os.path.getmtime(path) < os.path.getmtime(source)
+
+
+def _temp_path(path: str) -> str:
+    # Временный файл в том же каталоге: os.replace атомарен только в пределах одной файловой системы
+    return f'{path}.{os.getpid()}.tmp'
+
+
+def convert_word2vec(source: str, target: str) -> KeyedVectors:
+    """
+    Однократная конвертация word2vec из текстового/бинарного формата в нативный формат gensim.
+    Матрица векторов сохраняется отдельным .npy файлом, чтобы её можно было открыть через mmap.
+    Файлы пишутся во временные и переименовываются на место, поэтому воркеры uvicorn,
+    стартующие одновременно, не откроют наполовину записанную модель.
+    """
+    logger.info(f"Converting {source} -> {target}")
+    vectors = KeyedVectors.load_word2vec_format(source, binary=source.endswith('.bin'))
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    temp = _temp_path(target)
+    vectors.save(temp, separately=['vectors'])
+    # Матрица переименовывается первой: наличие target означает, что модель готова
+    os.replace(temp + '.vectors.npy', target + '.vectors.npy')
+    os.replace(temp, target)
+    return vectors
+
+
+def load_word2vec(source: str, target: str) -> KeyedVectors:
+    """Загрузка векторов через mmap: страницы матрицы разделяются между процессами uvicorn"""
+    if _is_stale(target, source):
+        convert_word2vec(source, target)
+    return KeyedVectors.load(target, mmap='r')
+
+
+def load_unit_vectors(vectors: KeyedVectors, target: str) -> np.ndarray:
+    """
+    Матрица векторов единичной длины (нулевые векторы остаются нулевыми).
+    Сохраняется рядом с моделью (атомарно, как в convert_word2vec) и открывается через mmap,
+    как и исходные векторы; пересчитывается, если модель новее сохранённой матрицы.
+    """
+    path = target + '.unit.npy'
+    if _is_stale(path, target):
+        matrix = np.asarray(vectors.vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        temp = _temp_path(path)
+        with open(temp, 'wb') as f:
+            np.save(f, matrix / norms)
+        os.replace(temp, path)
+    return np.load(path, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Конвертация word2vec в формат для mmap-загрузки")
+    parser.add_argument('--source', default=settings.WORD2VEC_PATH)
+    parser.add_argument('--target', default=settings.WORD2VEC_MMAP_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    load_unit_vectors(convert_word2vec(args.source, args.target), args.target)
@@ -1,18 +1,28 @@
 import os
+import sys
+from functools import partial
+
 import torch
 import numpy as np
 from sklearn.metrics import confusion_matrix
 from transformers import BertTokenizer, BertForSequenceClassification
 from torch.optim import AdamW
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 from sklearn.model_selection import train_test_split
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cases-errors-detection'))
+
+from dataset import window_spans
+
 MODEL_NAME = 'DeepPavlov/rubert-base-cased'
 BATCH_SIZE = 16
 EPOCHS = 8
 LEARNING_RATE = 5e-6
 MAX_LENGTH = 256
+# Перекрытие окон для текстов длиннее MAX_LENGTH (None - обрезка). Окно получает метку всего текста,
+# поэтому для неверных текстов окна без ошибки размечаются шумно; при оценке окна сводятся merge_window_scores
+STRIDE = None
 
 CORRECT_DIR = '/home/roman/projects/mag/ts/caseErrorsBinaryClassification/correct'
 INCORRECT_DIR = '/home/roman/projects/mag/ts/caseErrorsBinaryClassification/incorrect'
@@ -35,35 +45,111 @@ def load_data():
     return texts, labels
 
 
+def encode_windows(texts, tokenizer, max_length, stride):
+    """Окна по max_length токенов (со служебными) для всех текстов и номер текста каждого окна"""
+    content = tokenizer(texts, add_special_tokens=False)['input_ids']
+    window = max_length - tokenizer.num_special_tokens_to_add(pair=False)
+    input_ids, doc_ids = [], []
+    for doc, ids in enumerate(content):
+        for start, end in window_spans(len(ids), window, stride):
+            input_ids.append(tokenizer.build_inputs_with_special_tokens(ids[start:end]))
+            doc_ids.append(doc)
+    attention_mask = [[1] * len(ids) for ids in input_ids]
+    return {'input_ids': input_ids, 'attention_mask': attention_mask}, doc_ids
+
+
+def merge_window_scores(doc_ids, correct_probs, n_docs):
+    """Вероятность корректности текста - минимум по его окнам: ошибка в любом окне делает текст неверным"""
+    scores = np.ones(n_docs)
+    np.minimum.at(scores, np.asarray(doc_ids), np.asarray(correct_probs))
+    return scores
+
+
 class TextDataset(Dataset):
-    def __init__(self, texts, labels, tokenizer, max_length):
+    """
+    Тексты токенизируются один раз при создании, без паддинга (его добавляет collate_batch).
+    Если задан stride, длинные тексты не обрезаются, а делятся на окна по max_length токенов
+    с перекрытием stride; элемент датасета - окно с меткой текста, 'idx' - номер текста.
+    """
+    def __init__(self, texts, labels, tokenizer, max_length, stride=None):
         self.texts = texts
         self.labels = labels
         self.tokenizer = tokenizer
         self.max_length = max_length
+        if stride is None:
+            self.encodings = tokenizer(
+                texts,
+                max_length=max_length,
+                truncation=True
+            )
+            self.doc_ids = list(range(len(texts)))
+        else:
+            self.encodings, self.doc_ids = encode_windows(texts, tokenizer, max_length, stride)
+        self.lengths = [len(ids) for ids in self.encodings['input_ids']]
 
     def __len__(self):
-        return len(self.texts)
+        return len(self.doc_ids)
 
     def __getitem__(self, idx):
-        text = self.texts[idx]
-        label = self.labels[idx]
-
-        encoding = self.tokenizer(
-            text,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
-
+        doc = self.doc_ids[idx]
         return {
-            'input_ids': encoding['input_ids'].flatten(),
-            'attention_mask': encoding['attention_mask'].flatten(),
-            'labels': torch.tensor(label, dtype=torch.long)
+            'input_ids': torch.tensor(self.encodings['input_ids'][idx], dtype=torch.long),
+            'attention_mask': torch.tensor(self.encodings['attention_mask'][idx], dtype=torch.long),
+            'labels': torch.tensor(self.labels[doc], dtype=torch.long),
+            'idx': doc
         }
 
 
+class LengthGroupedBatchSampler(Sampler):
+    """
+    Пакеты из примеров близкой длины, чтобы паддинг до самого длинного примера был минимальным.
+    При shuffle примеры перемешиваются, сортируются по длине внутри групп
+    из bucket_size пакетов, а затем перемешивается порядок самих пакетов.
+    """
+    def __init__(self, lengths, batch_size, shuffle=False, bucket_size=50):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = bucket_size
+
+    def __iter__(self):
+        if self.shuffle:
+            indices = np.random.permutation(len(self.lengths))
+            group = self.batch_size * self.bucket_size
+            indices = [
+                int(idx)
+                for start in range(0, len(indices), group)
+                for idx in sorted(indices[start:start + group], key=lambda idx: self.lengths[idx])
+            ]
+        else:
+            indices = np.argsort(self.lengths, kind='stable').tolist()
+
+        batches = [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+        if self.shuffle:
+            np.random.shuffle(batches)
+        return iter(batches)
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
+def collate_batch(batch, pad_token_id=0):
+    """Паддинг только до самого длинного примера в пакете"""
+    max_len = max(len(item['input_ids']) for item in batch)
+    input_ids = torch.full((len(batch), max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+    for i, item in enumerate(batch):
+        length = len(item['input_ids'])
+        input_ids[i, :length] = item['input_ids']
+        attention_mask[i, :length] = item['attention_mask']
+    return {
+        'input_ids': input_ids,
+        'attention_mask': attention_mask,
+        'labels': torch.stack([item['labels'] for item in batch]),
+        'idx': torch.tensor([item['idx'] for item in batch], dtype=torch.long)
+    }
+
+
 def print_confusion_matrix(y_true, y_pred, class_names):
     cm = confusion_matrix(y_true, y_pred)
     print("\nМатрица ошибок:")
@@ -92,11 +178,20 @@ def main():
 
     tokenizer = BertTokenizer.from_pretrained(MODEL_NAME)
 
-    train_dataset = TextDataset(train_texts, train_labels, tokenizer, MAX_LENGTH)
-    val_dataset = TextDataset(val_texts, val_labels, tokenizer, MAX_LENGTH)
+    train_dataset = TextDataset(train_texts, train_labels, tokenizer, MAX_LENGTH, STRIDE)
+    val_dataset = TextDataset(val_texts, val_labels, tokenizer, MAX_LENGTH, STRIDE)
 
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE)
+    collate = partial(collate_batch, pad_token_id=tokenizer.pad_token_id)
+    train_loader = DataLoader(
+        train_dataset,
+        batch_sampler=LengthGroupedBatchSampler(train_dataset.lengths, BATCH_SIZE, shuffle=True),
+        collate_fn=collate
+    )
+    val_loader = DataLoader(
+        val_dataset,
+        batch_sampler=LengthGroupedBatchSampler(val_dataset.lengths, BATCH_SIZE),
+        collate_fn=collate
+    )
 
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     model = BertForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=2)
@@ -1,13 +1,19 @@
 import os
+from functools import partial
+
 import torch
 from sklearn.metrics import confusion_matrix
 from transformers import BertTokenizer, BertForSequenceClassification
 from torch.utils.data import Dataset, DataLoader
 from tqdm import tqdm
-from cases_binary_bert import print_confusion_matrix, TextDataset
+from cases_binary_bert import print_confusion_matrix, TextDataset, LengthGroupedBatchSampler, collate_batch, \
+    merge_window_scores
 MODEL_PATH = 'bert_binary_classifier'
 BATCH_SIZE = 16
 MAX_LENGTH = 256
+# Перекрытие окон, чтобы тексты длиннее MAX_LENGTH оценивались целиком (например, 64).
+# None - прежняя обрезка до MAX_LENGTH
+STRIDE = None
 
 
 def load_test_data(test_dir):
@@ -44,38 +50,39 @@ def evaluate_model(test_dir):
     model.to(device)
     model.eval()
 
-    test_dataset = TextDataset(test_texts, test_labels, tokenizer, MAX_LENGTH)
-    test_loader = DataLoader(test_dataset, batch_size=BATCH_SIZE)
+    test_dataset = TextDataset(test_texts, test_labels, tokenizer, MAX_LENGTH, STRIDE)
+    test_loader = DataLoader(
+        test_dataset,
+        batch_sampler=LengthGroupedBatchSampler(test_dataset.lengths, BATCH_SIZE),
+        collate_fn=partial(collate_batch, pad_token_id=tokenizer.pad_token_id)
+    )
 
-    all_preds = []
-    all_labels = []
-    incorrect_predictions = []
+    # Окна всех текстов идут общими пакетами, вероятность класса Correct сводится по текстам
+    window_docs = []
+    window_probs = []
 
     with torch.no_grad():
         for batch_idx, batch in enumerate(tqdm(test_loader)):
             input_ids = batch['input_ids'].to(device)
             attention_mask = batch['attention_mask'].to(device)
-            labels = batch['labels'].to(device)
 
             outputs = model(
                 input_ids=input_ids,
                 attention_mask=attention_mask
             )
 
-            _, preds = torch.max(outputs.logits, dim=1)
-
-            all_preds.extend(preds.cpu().numpy())
-            all_labels.extend(labels.cpu().numpy())
-
-            for i in range(len(preds)):
-                print(preds[i] == labels[i])
-                if preds[i] != labels[i]:
-                    sample_idx = batch_idx * BATCH_SIZE + i
-                    incorrect_predictions.append((
-                        test_filenames[sample_idx],
-                        preds[i].item(),
-                        test_texts[sample_idx]
-                    ))
+            # пакеты сгруппированы по длине, поэтому индекс текста берётся из пакета
+            window_docs.extend(batch['idx'].tolist())
+            window_probs.extend(torch.softmax(outputs.logits, dim=1)[:, 1].cpu().numpy())
+
+    scores = merge_window_scores(window_docs, window_probs, len(test_texts))
+    all_preds = (scores > 0.5).astype(int).tolist()
+    all_labels = test_labels
+    incorrect_predictions = [
+        (test_filenames[sample_idx], pred, test_texts[sample_idx])
+        for sample_idx, (pred, label) in enumerate(zip(all_preds, all_labels))
+        if pred != label
+    ]
 
     print_confusion_matrix(
         all_labels,
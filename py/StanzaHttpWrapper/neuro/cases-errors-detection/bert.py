@@ -7,6 +7,11 @@ from dataset import *
 
 
 data_dir = "/home/roman/projects/mag/ts/corpus-final"
+cache_dir = "./dataset-cache"
+max_length = 512
+# Перекрытие окон: документы длиннее max_length делятся на окна, а не обрезаются (например, 128).
+# None - прежняя обрезка до max_length
+stride = None
 
 json_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir)]
 
@@ -16,12 +21,15 @@ train_files, eval_files = train_test_split(json_files, test_size=0.2, random_sta
 
 tokenizer = AutoTokenizer.from_pretrained("DeepPavlov/rubert-base-cased")
 
-train_dataset = GrammarDataset(train_files, tokenizer)
-eval_dataset = GrammarDataset(eval_files, tokenizer)
+train_dataset = GrammarDataset(train_files, tokenizer, cache_dir=cache_dir, max_length=max_length, stride=stride)
+eval_dataset = GrammarDataset(eval_files, tokenizer, cache_dir=cache_dir, max_length=max_length, stride=stride)
 
 model = BertForTokenClassification.from_pretrained(
     "DeepPavlov/rubert-base-cased",
-    num_labels=len(label_list)
+    num_labels=len(label_list),
+    # Названия классов сохраняются в чекпойнте: по ним сервис (app.utils.grammar) декодирует предсказания
+    id2label=dict(enumerate(label_list)),
+    label2id=label_map
 )
 
 data_collator = DataCollatorForTokenClassification(tokenizer)
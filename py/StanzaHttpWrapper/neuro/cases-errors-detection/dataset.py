@@ -1,40 +1,237 @@
 from torch.utils.data import Dataset
+import hashlib
 import json
+import os
+import numpy as np
 label_list = ["O", "Voice", "paronym", "typo", "Number", "Gender", "Tense", "Case", "Person"]
 label_map = {label: i for i, label in enumerate(label_list)}
 
+
+def read_file(file):
+    with open(file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    words = data["text"].split()
+    labels = ["O"] * len(words)
+    for annotation in data["annotations"]:
+        labels[annotation["wordNumber"]] = annotation["type"]
+    return words, labels
+
+
+def encode_file(file, tokenizer):
+    words, labels = read_file(file)
+    tokenized = tokenizer(
+        words,
+        is_split_into_words=True,
+        truncation=True
+    )
+    word_ids = tokenized.word_ids()
+    aligned_labels = []
+    for word_id in word_ids:
+        if word_id is None:
+            aligned_labels.append(-100)  # -100 игнорируется при потере
+        else:
+            aligned_labels.append(label_map[labels[word_id]])
+
+    return {
+        "input_ids": tokenized["input_ids"],
+        "attention_mask": tokenized["attention_mask"],
+        "labels": aligned_labels
+    }
+
+
+def window_spans(n_tokens, window, stride):
+    """Границы окон по window токенов; соседние окна перекрываются на stride токенов"""
+    if stride >= window:
+        raise ValueError(f"stride ({stride}) must be smaller than the window ({window})")
+    if n_tokens <= window:
+        return [(0, n_tokens)]
+    starts = list(range(0, n_tokens - window, window - stride)) + [n_tokens - window]
+    return [(start, start + window) for start in starts]
+
+
+def window_owners(spans, n_tokens):
+    """
+    Для каждого токена - окно, в котором он дальше всего от края (там у него больше контекста).
+    Только в этом окне токен получает метку и только из него берётся его предсказание.
+    """
+    owners = np.zeros(n_tokens, dtype=np.int64)
+    best = np.full(n_tokens, -1, dtype=np.int64)
+    for window_id, (start, end) in enumerate(spans):
+        positions = np.arange(start, end)
+        margin = np.minimum(positions - start, end - 1 - positions)
+        better = margin > best[start:end]
+        owners[start:end][better] = window_id
+        best[start:end][better] = margin[better]
+    return owners
+
+
+def encode_windows(words, labels, tokenizer, max_length=512, stride=128):
+    """
+    Документ любой длины - набор окон по max_length токенов (со служебными) с перекрытием stride.
+    word_index окна указывает номер слова (wordNumber) для первого подтокена слова,
+    если окно владеет этим токеном, иначе -1; по нему предсказания собираются обратно в слова.
+    """
+    tokenized = tokenizer(words, is_split_into_words=True, add_special_tokens=False)
+    content_ids = tokenized["input_ids"]
+    word_ids = tokenized.word_ids()
+    window = max_length - tokenizer.num_special_tokens_to_add(pair=False)
+    spans = window_spans(len(content_ids), window, stride)
+    owners = window_owners(spans, len(content_ids))
+
+    windows = []
+    for window_id, (start, end) in enumerate(spans):
+        input_ids = tokenizer.build_inputs_with_special_tokens(content_ids[start:end])
+        special = tokenizer.get_special_tokens_mask(content_ids[start:end])
+        aligned_labels, word_index = [], []
+        position = start
+        for is_special in special:
+            if is_special:
+                aligned_labels.append(-100)
+                word_index.append(-1)
+                continue
+            word_id = word_ids[position]
+            owned = owners[position] == window_id
+            first = position == 0 or word_ids[position - 1] != word_id
+            aligned_labels.append(label_map[labels[word_id]] if owned and labels is not None else -100)
+            word_index.append(word_id if owned and first else -1)
+            position += 1
+        windows.append({
+            "input_ids": input_ids,
+            "attention_mask": [1] * len(input_ids),
+            "labels": aligned_labels,
+            "word_index": word_index
+        })
+    return windows
+
+
+def encode_file_windows(file, tokenizer, max_length=512, stride=128):
+    words, labels = read_file(file)
+    return encode_windows(words, labels, tokenizer, max_length, stride), len(words)
+
+
+def merge_window_predictions(predicted_ids, word_index, doc_ids, doc_words):
+    """
+    Метки по словам документов из предсказаний по окнам.
+    predicted_ids и word_index - по окнам (последовательности любой длины, паддинг отбрасывается
+    по длине word_index), doc_ids - номер документа окна, doc_words - число слов в документах.
+    """
+    merged = [["O"] * n for n in doc_words]
+    for predictions, indexes, doc in zip(predicted_ids, word_index, doc_ids):
+        for label_id, word in zip(predictions, indexes):
+            if word >= 0:
+                merged[doc][word] = label_list[label_id]
+    return merged
+
+
+def cache_path(data_files, tokenizer, cache_dir, max_length=None, stride=None):
+    # Кэш зависит от токенизатора, списка файлов и параметров окон
+    digest = hashlib.sha256(tokenizer.name_or_path.encode("utf-8"))
+    if stride is not None:
+        digest.update(f"windows:{max_length}:{stride}".encode("utf-8"))
+    for file in data_files:
+        digest.update(file.encode("utf-8") + b"\0")
+    return os.path.join(cache_dir, digest.hexdigest()[:16])
+
+
+def encode_files(data_files, tokenizer, max_length=None, stride=None):
+    """Примеры по файлам; в режиме окон - окна всех документов, номер документа окна и число слов"""
+    if stride is None:
+        return [encode_file(file, tokenizer) for file in data_files], None, None
+    samples, doc_ids, doc_words = [], [], []
+    for doc, file in enumerate(data_files):
+        windows, n_words = encode_file_windows(file, tokenizer, max_length, stride)
+        samples.extend(windows)
+        doc_ids.extend([doc] * len(windows))
+        doc_words.append(n_words)
+    return samples, doc_ids, doc_words
+
+
+def build_cache(data_files, tokenizer, path, max_length=None, stride=None):
+    """Однократная токенизация в плоские массивы input_ids/attention_mask/labels + смещения примеров"""
+    samples, doc_ids, doc_words = encode_files(data_files, tokenizer, max_length, stride)
+    offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(sample["input_ids"]) for sample in samples])
+
+    os.makedirs(path, exist_ok=True)
+    keys = [("input_ids", np.int32), ("attention_mask", np.int8), ("labels", np.int16)]
+    if stride is not None:
+        keys.append(("word_index", np.int32))
+        np.save(os.path.join(path, "doc_ids.npy"), np.array(doc_ids, dtype=np.int64))
+        np.save(os.path.join(path, "doc_words.npy"), np.array(doc_words, dtype=np.int64))
+    for key, dtype in keys:
+        flat = np.fromiter(
+            (value for sample in samples for value in sample[key]),
+            dtype=dtype,
+            count=int(offsets[-1])
+        )
+        np.save(os.path.join(path, f"{key}.npy"), flat)
+    # offsets пишется последним и служит признаком готового кэша
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+
+
 class GrammarDataset(Dataset):
-    def __init__(self, data_files, tokenizer):
-        self.data = []
-        for file in data_files:
-            with open(file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            words = data["text"].split()
-            labels = ["O"] * len(words)
-            for annotation in data["annotations"]:
-                labels[annotation["wordNumber"]] = annotation["type"]
-
-            tokenized = tokenizer(
-                words,
-                is_split_into_words=True,
-                truncation=True
-            )
-            word_ids = tokenized.word_ids()
-            aligned_labels = []
-            for word_id in word_ids:
-                if word_id is None:
-                    aligned_labels.append(-100)  # -100 игнорируется при потере
-                else:
-                    aligned_labels.append(label_map[labels[word_id]])
-
-            self.data.append({
-                "input_ids": tokenized["input_ids"],
-                "attention_mask": tokenized["attention_mask"],
-                "labels": aligned_labels
-            })
+    """
+    Если задан cache_dir, токенизированные данные один раз сохраняются на диск
+    и затем открываются через mmap: повторная загрузка мгновенная, а страницы
+    разделяются между воркерами DataLoader.
+
+    Если задан stride, документы не обрезаются, а делятся на окна по max_length токенов
+    с перекрытием stride; элемент датасета - окно, окна разных документов попадают
+    в общие пакеты. Метку каждый токен получает в одном окне (см. window_owners),
+    поэтому при оценке токены не учитываются дважды; merge_predictions собирает
+    предсказания по окнам обратно в метки слов документов.
+    """
+    def __init__(self, data_files, tokenizer, cache_dir=None, max_length=512, stride=None):
+        self.data = None
+        self.files = list(data_files)
+        self.windowed = stride is not None
+        if cache_dir is None:
+            self.data, self.doc_ids, self.doc_words = encode_files(data_files, tokenizer, max_length, stride)
+            if self.windowed:
+                self.word_indexes = [sample.pop("word_index") for sample in self.data]
+            return
+
+        path = cache_path(data_files, tokenizer, cache_dir, max_length, stride)
+        if not os.path.exists(os.path.join(path, "offsets.npy")):
+            build_cache(data_files, tokenizer, path, max_length, stride)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.arrays = {
+            key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r")
+            for key in ("input_ids", "attention_mask", "labels")
+        }
+        if self.windowed:
+            self.doc_ids = np.load(os.path.join(path, "doc_ids.npy")).tolist()
+            self.doc_words = np.load(os.path.join(path, "doc_words.npy")).tolist()
+            self.word_index_array = np.load(os.path.join(path, "word_index.npy"), mmap_mode="r")
+
+    def word_index(self, idx):
+        """Номера слов по позициям окна idx (-1 - позиция не соответствует слову документа)"""
+        if self.data is not None:
+            return self.word_indexes[idx]
+        return self.word_index_array[self.offsets[idx]:self.offsets[idx + 1]].tolist()
+
+    def lengths(self):
+        if self.data is not None:
+            return [len(sample["input_ids"]) for sample in self.data]
+        return np.diff(self.offsets).tolist()
+
+    def merge_predictions(self, predicted_ids, indices=None):
+        """Метки слов по документам; predicted_ids - по окнам в порядке indices (по умолчанию всех)"""
+        indices = range(len(self)) if indices is None else indices
+        return merge_window_predictions(
+            predicted_ids,
+            [self.word_index(idx) for idx in indices],
+            [self.doc_ids[idx] for idx in indices],
+            self.doc_words
+        )
 
     def __len__(self):
-        return len(self.data)
+        if self.data is not None:
+            return len(self.data)
+        return len(self.offsets) - 1
 
     def __getitem__(self, idx):
-        return self.data[idx]
+        if self.data is not None:
+            return self.data[idx]
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {key: array[start:end].tolist() for key, array in self.arrays.items()}
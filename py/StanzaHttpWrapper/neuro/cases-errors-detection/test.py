@@ -1,30 +1,36 @@
+import argparse
+import json
 import os
+from collections import Counter
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from tqdm import tqdm
 from transformers import AutoTokenizer, BertForTokenClassification, Trainer, DataCollatorForTokenClassification
 from seqeval.metrics import classification_report
+from seqeval.metrics.sequence_labeling import get_entities
+from seqeval.reporters import StringReporter
 from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
 import matplotlib.pyplot as plt
 from dataset import GrammarDataset
 
 model_dir = "./results-more-classes/checkpoint-15500"
 
-tokenizer = AutoTokenizer.from_pretrained("DeepPavlov/rubert-base-cased")
-model = BertForTokenClassification.from_pretrained(model_dir)
-
 label_list = ["O", "Voice", "paronym", "typo", "Number", "Gender", "Tense", "Case", "Person"]
 label_map = {label: i for i, label in enumerate(label_list)}
 
 data_dir = "/home/roman/projects/mag/ts/corpus-final-2"
+cache_dir = "./dataset-cache"
 N = 1000
-json_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir)][:N]
 
-test_dataset = GrammarDataset(json_files, tokenizer)
 
-trainer = Trainer(
-    model=model,
-    data_collator=DataCollatorForTokenClassification(tokenizer)
-)
+def load_test_dataset(tokenizer, n=N, max_length=512, stride=None):
+    json_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir)]
+    if n:
+        json_files = json_files[:n]
+    return GrammarDataset(json_files, tokenizer, cache_dir=cache_dir, max_length=max_length, stride=stride)
 
-predictions, labels, _ = trainer.predict(test_dataset)
 
 def decode_predictions(predictions, label_list):
     predicted_labels = []
@@ -33,40 +39,204 @@ def decode_predictions(predictions, label_list):
         predicted_labels.append([label_list[label_id] for label_id in predicted_label_ids])
     return predicted_labels
 
-decoded_predictions = decode_predictions(predictions, label_list)
-
-true_labels = []
-for label in labels:
-    true_labels.append([label_list[l] if l != -100 else "O" for l in label])
-
-filtered_predictions = []
-filtered_true_labels = []
-
-for preds, trues in zip(decoded_predictions, true_labels):
-    filtered_preds = []
-    filtered_trues = []
-    for pred, true in zip(preds, trues):
-        if true != "O":
-            filtered_preds.append(pred)
-            filtered_trues.append(true)
-    filtered_predictions.append(filtered_preds)
-    filtered_true_labels.append(filtered_trues)
-
-report = classification_report(filtered_true_labels, filtered_predictions, digits=4)
-print("Classification Report:")
-print(report)
-
-flat_filtered_true_labels = [label for sublist in filtered_true_labels for label in sublist]
-flat_filtered_predictions = [label for sublist in filtered_predictions for label in sublist]
-
-cm = confusion_matrix(flat_filtered_true_labels, flat_filtered_predictions, labels=label_list)
-disp = ConfusionMatrixDisplay(confusion_matrix=cm, display_labels=label_list)
-
-plt.figure(figsize=(20, 16))
-disp.plot(cmap=plt.cm.Blues, values_format=".0f", xticks_rotation=45)
-
-plt.title("Confusion Matrix")
 
-output_file = "confusion_matrix-1000.png"
-plt.savefig(output_file, bbox_inches="tight", dpi=300)
-print(f"Confusion matrix saved to {output_file}")
\ No newline at end of file
+def report_predictions(predictions, labels, output_file="confusion_matrix-1000.png"):
+    """seqeval-отчёт и матрица ошибок по позициям с ошибкой (логиты и метки по примерам)"""
+    decoded_predictions = decode_predictions(predictions, label_list)
+
+    true_labels = []
+    for label in labels:
+        true_labels.append([label_list[l] if l != -100 else "O" for l in label])
+
+    filtered_predictions = []
+    filtered_true_labels = []
+
+    for preds, trues in zip(decoded_predictions, true_labels):
+        filtered_preds = []
+        filtered_trues = []
+        for pred, true in zip(preds, trues):
+            if true != "O":
+                filtered_preds.append(pred)
+                filtered_trues.append(true)
+        filtered_predictions.append(filtered_preds)
+        filtered_true_labels.append(filtered_trues)
+
+    report = classification_report(filtered_true_labels, filtered_predictions, digits=4)
+    print("Classification Report:")
+    print(report)
+
+    flat_filtered_true_labels = [label for sublist in filtered_true_labels for label in sublist]
+    flat_filtered_predictions = [label for sublist in filtered_predictions for label in sublist]
+
+    cm = confusion_matrix(flat_filtered_true_labels, flat_filtered_predictions, labels=label_list)
+    plot_confusion_matrix(cm, output_file)
+    return report
+
+
+def plot_confusion_matrix(cm, output_file):
+    disp = ConfusionMatrixDisplay(confusion_matrix=cm, display_labels=label_list)
+
+    plt.figure(figsize=(20, 16))
+    disp.plot(cmap=plt.cm.Blues, values_format=".0f", xticks_rotation=45)
+
+    plt.title("Confusion Matrix")
+
+    plt.savefig(output_file, bbox_inches="tight", dpi=300)
+    print(f"Confusion matrix saved to {output_file}")
+
+
+class StreamingReport:
+    """
+    Накопление по пакетам того же отчёта, что и report_predictions, в постоянной памяти:
+    матрица ошибок и счётчики сущностей seqeval по позициям, где истинная метка не "O".
+    """
+    def __init__(self):
+        self.cm = np.zeros((len(label_list), len(label_list)), dtype=np.int64)
+        self.true_counts = Counter()
+        self.pred_counts = Counter()
+        self.correct_counts = Counter()
+
+    def update(self, predicted_ids, label_ids):
+        mask = (label_ids != -100) & (label_ids != label_map["O"])
+        np.add.at(self.cm, (label_ids[mask], predicted_ids[mask]), 1)
+
+        for preds, trues, row_mask in zip(predicted_ids, label_ids, mask):
+            true_entities = set(get_entities([label_list[l] for l in trues[row_mask]]))
+            pred_entities = set(get_entities([label_list[l] for l in preds[row_mask]]))
+            self.true_counts.update(type_name for type_name, _, _ in true_entities)
+            self.pred_counts.update(type_name for type_name, _, _ in pred_entities)
+            self.correct_counts.update(type_name for type_name, _, _ in true_entities & pred_entities)
+
+    @staticmethod
+    def _scores(correct, predicted, support):
+        precision = correct / predicted if predicted else 0.0
+        recall = correct / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return precision, recall, f1
+
+    def classification_report(self, digits=4):
+        target_names = sorted(set(self.true_counts) | set(self.pred_counts))
+        width = max([len(name) for name in target_names] + [len("weighted avg"), digits])
+        reporter = StringReporter(width=width, digits=digits)
+
+        rows = []
+        for name in target_names:
+            support = self.true_counts[name]
+            rows.append((*self._scores(self.correct_counts[name], self.pred_counts[name], support), support))
+            reporter.write(name, *rows[-1])
+        reporter.write_blank()
+
+        total = sum(self.true_counts.values())
+        reporter.write("micro avg", *self._scores(
+            sum(self.correct_counts.values()), sum(self.pred_counts.values()), total
+        ), total)
+        columns = np.array([row[:3] for row in rows]) if rows else np.zeros((1, 3))
+        supports = np.array([row[3] for row in rows]) if rows else np.zeros(1)
+        reporter.write("macro avg", *columns.mean(axis=0), total)
+        weighted = (columns * supports[:, None]).sum(axis=0) / total if total else np.zeros(3)
+        reporter.write("weighted avg", *weighted, total)
+        reporter.write_blank()
+        return reporter.report()
+
+
+def evaluate_streaming(model, dataset, tokenizer, batch_size=16, output_file="confusion_matrix.png"):
+    """Оценка по пакетам: логиты сразу сводятся к argmax и накапливаются в StreamingReport"""
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model.to(device)
+    model.eval()
+
+    loader = DataLoader(dataset, batch_size=batch_size, collate_fn=DataCollatorForTokenClassification(tokenizer))
+    streaming_report = StreamingReport()
+    with torch.inference_mode():
+        for batch in tqdm(loader):
+            logits = model(
+                input_ids=batch["input_ids"].to(device),
+                attention_mask=batch["attention_mask"].to(device)
+            ).logits
+            streaming_report.update(logits.argmax(dim=-1).cpu().numpy(), batch["labels"].numpy())
+
+    report = streaming_report.classification_report(digits=4)
+    print("Classification Report:")
+    print(report)
+    plot_confusion_matrix(streaming_report.cm, output_file)
+    return report
+
+
+def predict_documents(model, dataset, tokenizer, batch_size=16):
+    """
+    Метки слов по документам оконного датасета. Окна всех документов сортируются по длине
+    и идут полными пакетами, предсказания в перекрытиях сводятся через dataset.merge_predictions.
+    """
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model.to(device)
+    model.eval()
+
+    lengths = dataset.lengths()
+    order = np.argsort(lengths, kind="stable").tolist()
+    collator = DataCollatorForTokenClassification(tokenizer)
+    predicted_ids = []
+    with torch.inference_mode():
+        for start in tqdm(range(0, len(order), batch_size)):
+            indices = order[start:start + batch_size]
+            batch = collator([dataset[idx] for idx in indices])
+            logits = model(
+                input_ids=batch["input_ids"].to(device),
+                attention_mask=batch["attention_mask"].to(device)
+            ).logits
+            predictions = logits.argmax(dim=-1).cpu().numpy()
+            predicted_ids.extend(row[:lengths[idx]] for row, idx in zip(predictions, indices))
+    return dataset.merge_predictions(predicted_ids, order)
+
+
+def write_annotations(dataset, labels, output_file):
+    """Предсказанные ошибки в формате корпуса: wordNumber и type для каждого слова с меткой, отличной от O"""
+    with open(output_file, "w", encoding="utf-8") as f:
+        for file, words in zip(dataset.files, labels):
+            annotations = [
+                {"wordNumber": number, "type": label}
+                for number, label in enumerate(words) if label != "O"
+            ]
+            f.write(json.dumps({"file": file, "annotations": annotations}, ensure_ascii=False) + "\n")
+    print(f"Annotations saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=N, help="Число файлов (0 - весь корпус)")
+    parser.add_argument("--streaming", action="store_true", help="Оценка по пакетам в постоянной памяти")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=512, help="Длина окна в токенах (со служебными)")
+    parser.add_argument("--stride", type=int, default=None,
+                        help="Перекрытие окон: документы делятся на окна вместо обрезки до max-length")
+    parser.add_argument("--annotate", default=None,
+                        help="JSONL с предсказанными ошибками по словам документов (требует --stride)")
+    args = parser.parse_args()
+    if args.annotate and args.stride is None:
+        parser.error("--annotate requires --stride")
+
+    tokenizer = AutoTokenizer.from_pretrained("DeepPavlov/rubert-base-cased")
+    model = BertForTokenClassification.from_pretrained(model_dir)
+
+    test_dataset = load_test_dataset(tokenizer, args.n, args.max_length, args.stride)
+    output_file = f"confusion_matrix-{args.n or 'all'}.png"
+
+    if args.annotate:
+        labels = predict_documents(model, test_dataset, tokenizer, args.batch_size)
+        write_annotations(test_dataset, labels, args.annotate)
+        return
+
+    if args.streaming:
+        evaluate_streaming(model, test_dataset, tokenizer, args.batch_size, output_file)
+        return
+
+    trainer = Trainer(
+        model=model,
+        data_collator=DataCollatorForTokenClassification(tokenizer)
+    )
+
+    predictions, labels, _ = trainer.predict(test_dataset)
+    report_predictions(predictions, labels, output_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from functools import partial
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from transformers import (
+    AutoTokenizer,
+    BertForSequenceClassification,
+    BertForTokenClassification,
+    DataCollatorForTokenClassification
+)
+
+from export import BINARY_MODEL_PATH, TOKEN_MODEL_PATH, TOKEN_TOKENIZER, OUTPUT_DIR
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BINARY_DIR = os.path.join(HERE, '..', 'cases-errors-binary')
+DETECTION_DIR = os.path.join(HERE, '..', 'cases-errors-detection')
+sys.path.insert(0, BINARY_DIR)
+sys.path.insert(0, DETECTION_DIR)
+
+from cases_binary_bert import print_confusion_matrix, TextDataset, LengthGroupedBatchSampler, collate_batch
+
+BINARY_TEST_DIR = '/home/roman/projects/mag/corpus/rozovskaya-case-errors'
+BATCH_SIZE = 16
+MAX_LENGTH = 256
+BACKENDS = ['fp32', 'int8', 'onnx', 'onnx-int8']
+
+
+def load_script(name, path):
+    # Скрипты с дефисом в имени (и test.py, совпадающий с модулем stdlib) импортируются по пути
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TorchBackend:
+    def __init__(self, model):
+        self.model = model
+        self.model.eval()
+
+    def __call__(self, input_ids, attention_mask):
+        with torch.inference_mode():
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).logits.numpy()
+
+
+class OnnxBackend:
+    def __init__(self, path):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+
+    def __call__(self, input_ids, attention_mask):
+        return self.session.run(['logits'], {
+            'input_ids': input_ids.numpy(),
+            'attention_mask': attention_mask.numpy()
+        })[0]
+
+
+def make_backend(name, task, model_class, model_path):
+    exported = os.path.join(OUTPUT_DIR, task)
+    if name == 'fp32':
+        return TorchBackend(model_class.from_pretrained(model_path))
+    if name == 'int8':
+        return TorchBackend(torch.load(os.path.join(exported, 'model-int8.pt'), weights_only=False))
+    if name == 'onnx':
+        return OnnxBackend(os.path.join(exported, 'model.onnx'))
+    return OnnxBackend(os.path.join(exported, 'model-int8.onnx'))
+
+
+def run_backend(backend, loader):
+    """Логиты по пакетам и время обработки каждого пакета"""
+    outputs, timings = [], []
+    for batch in loader:
+        start = time.perf_counter()
+        logits = backend(batch['input_ids'], batch['attention_mask'])
+        timings.append(time.perf_counter() - start)
+        outputs.append((batch, logits))
+    return outputs, timings
+
+
+def latency_summary(timings, samples):
+    timings_ms = np.array(timings) * 1000
+    return {
+        'ms_per_sample': timings_ms.sum() / samples,
+        'p50_batch_ms': float(np.percentile(timings_ms, 50)),
+        'p95_batch_ms': float(np.percentile(timings_ms, 95)),
+        'samples_per_sec': samples / (timings_ms.sum() / 1000)
+    }
+
+
+def compare_binary(backends, limit):
+    test_script = load_script('test_bert_cases_binary', os.path.join(BINARY_DIR, 'test-bert-cases-binary.py'))
+    texts, labels, _ = test_script.load_test_data(BINARY_TEST_DIR)
+    texts, labels = texts[:limit], labels[:limit]
+
+    tokenizer = AutoTokenizer.from_pretrained(BINARY_MODEL_PATH)
+    dataset = TextDataset(texts, labels, tokenizer, MAX_LENGTH)
+    loader = DataLoader(
+        dataset,
+        batch_sampler=LengthGroupedBatchSampler(dataset.lengths, BATCH_SIZE),
+        collate_fn=partial(collate_batch, pad_token_id=tokenizer.pad_token_id)
+    )
+
+    summary = {}
+    for name in backends:
+        print(f"\n=== binary / {name} ===")
+        backend = make_backend(name, 'binary', BertForSequenceClassification, BINARY_MODEL_PATH)
+        outputs, timings = run_backend(backend, loader)
+        all_labels = np.concatenate([batch['labels'].numpy() for batch, _ in outputs])
+        all_preds = np.concatenate([logits.argmax(axis=-1) for _, logits in outputs])
+        print_confusion_matrix(all_labels, all_preds, class_names=["inCorrect", "Correct"])
+
+        summary[name] = latency_summary(timings, len(dataset))
+        summary[name]['accuracy'] = float((all_labels == all_preds).mean())
+    return summary
+
+
+def compare_token(backends, limit):
+    detection_test = load_script('detection_test', os.path.join(DETECTION_DIR, 'test.py'))
+    tokenizer = AutoTokenizer.from_pretrained(TOKEN_TOKENIZER)
+    dataset = detection_test.load_test_dataset(tokenizer, limit)
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, collate_fn=DataCollatorForTokenClassification(tokenizer))
+
+    summary = {}
+    for name in backends:
+        print(f"\n=== token / {name} ===")
+        backend = make_backend(name, 'token', BertForTokenClassification, TOKEN_MODEL_PATH)
+        outputs, timings = run_backend(backend, loader)
+        predictions = [row for _, logits in outputs for row in logits]
+        labels = [row for batch, _ in outputs for row in batch['labels'].numpy()]
+        detection_test.report_predictions(predictions, labels, output_file=f"confusion_matrix-{name}.png")
+
+        summary[name] = latency_summary(timings, len(dataset))
+        flat_true = np.concatenate([row[row != -100] for row in labels])
+        flat_pred = np.concatenate([pred.argmax(axis=-1)[true != -100] for pred, true in zip(predictions, labels)])
+        summary[name]['accuracy'] = float((flat_true == flat_pred).mean())
+    return summary
+
+
+def print_summary(task, summary):
+    print(f"\nИтог ({task}):")
+    print(f"{'backend':<12}{'accuracy':<12}{'ms/sample':<12}{'p50 batch':<12}{'p95 batch':<12}{'speedup':<10}")
+    base = summary.get('fp32', {}).get('ms_per_sample')
+    for name, row in summary.items():
+        speedup = f"{base / row['ms_per_sample']:.2f}x" if base else '-'
+        print(f"{name:<12}{row['accuracy']:<12.4f}{row['ms_per_sample']:<12.2f}"
+              f"{row['p50_batch_ms']:<12.1f}{row['p95_batch_ms']:<12.1f}{speedup:<10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение точности и задержки fp32 / int8 / ONNX на CPU")
+    parser.add_argument('--task', choices=['binary', 'token', 'all'], default='all')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=BACKENDS)
+    parser.add_argument('--limit', type=int, default=1000, help="Число примеров")
+    parser.add_argument('--threads', type=int, default=None, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.task in ('binary', 'all'):
+        print_summary('binary', compare_binary(args.backends, args.limit))
+    if args.task in ('token', 'all'):
+        print_summary('token', compare_token(args.backends, args.limit))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import os
+import torch
+from transformers import AutoTokenizer, BertForSequenceClassification, BertForTokenClassification
+
+BINARY_MODEL_PATH = '../cases-errors-binary/bert_binary_classifier'
+TOKEN_MODEL_PATH = '../cases-errors-detection/results-more-classes/checkpoint-15500'
+TOKEN_TOKENIZER = 'DeepPavlov/rubert-base-cased'
+OUTPUT_DIR = 'exported'
+ONNX_OPSET = 14
+
+
+class LogitsOnly(torch.nn.Module):
+    """Обёртка для экспорта: на выходе только логиты вместо ModelOutput"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def quantize_int8(model):
+    """Динамическая int8-квантизация линейных слоёв (веса int8, активации квантуются на лету)"""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(model, tokenizer, path, token_level):
+    sample = tokenizer(["Пример предложения для экспорта модели."], return_tensors='pt')
+    logits_axes = {0: 'batch', 1: 'sequence'} if token_level else {0: 'batch'}
+    torch.onnx.export(
+        LogitsOnly(model),
+        (sample['input_ids'], sample['attention_mask']),
+        path,
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['logits'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'logits': logits_axes
+        },
+        opset_version=ONNX_OPSET
+    )
+
+
+def quantize_onnx(source, target):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+
+
+def export_model(name, model_class, model_path, tokenizer_path, token_level):
+    output_dir = os.path.join(OUTPUT_DIR, name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+    model = model_class.from_pretrained(model_path)
+    model.eval()
+    tokenizer.save_pretrained(output_dir)
+
+    print(f"{name}: экспорт ONNX...")
+    onnx_path = os.path.join(output_dir, 'model.onnx')
+    export_onnx(model, tokenizer, onnx_path, token_level)
+    quantize_onnx(onnx_path, os.path.join(output_dir, 'model-int8.onnx'))
+
+    print(f"{name}: int8-квантизация PyTorch...")
+    torch.save(quantize_int8(model), os.path.join(output_dir, 'model-int8.pt'))
+    print(f"{name}: сохранено в {output_dir}")
+
+
+def main():
+    export_model('binary', BertForSequenceClassification, BINARY_MODEL_PATH, BINARY_MODEL_PATH, token_level=False)
+    export_model('token', BertForTokenClassification, TOKEN_MODEL_PATH, TOKEN_TOKENIZER, token_level=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from app.utils.ann import IVFIndex
+
+
+@pytest.fixture
+def vocabulary():
+    rng = np.random.default_rng(0)
+    unit = rng.normal(size=(400, 16)).astype(np.float32)
+    unit /= np.linalg.norm(unit, axis=1, keepdims=True)
+    # Редкий тег: прилагательных мало, и в n_probe кластерах их может не оказаться
+    keys = [f'слово{i}_{"ADJ" if i % 40 == 0 else "NOUN"}' for i in range(len(unit))]
+    return unit, keys
+
+
+def test_load_refuses_other_vocabulary(vocabulary, tmp_path):
+    unit, keys = vocabulary
+    IVFIndex.build(unit, keys, n_lists=8).save(str(tmp_path))
+
+    assert IVFIndex.load(str(tmp_path), keys).meta['n_keys'] == len(keys)
+    with pytest.raises(ValueError):
+        IVFIndex.load(str(tmp_path), keys[:-1])
+    with pytest.raises(ValueError):
+        IVFIndex.load(str(tmp_path), list(reversed(keys)))
+
+
+def test_search_probes_until_k_results_survive_filter(vocabulary):
+    unit, keys = vocabulary
+    index = IVFIndex.build(unit, keys, n_lists=20)
+    n_adjectives = sum(key.endswith('_ADJ') for key in keys)
+
+    ids, scores = index.search(unit[1], k=5, n_probe=1, pos='ADJ')
+    assert len(ids) == 5
+    assert all(keys[i].endswith('_ADJ') for i in ids)
+    assert list(scores) == sorted(scores, reverse=True)
+
+    ids, _ = index.search(unit[0], k=100, n_probe=1, pos='ADJ', exclude=0)
+    assert len(ids) == n_adjectives - 1
+    assert 0 not in ids
+
+
+def test_search_matches_exact_neighbours_when_probing_everything(vocabulary):
+    unit, keys = vocabulary
+    index = IVFIndex.build(unit, keys, n_lists=8)
+    scores = unit @ unit[3]
+    scores[3] = -np.inf
+    expected = np.argsort(-scores)[:10]
+
+    ids, _ = index.search(unit[3], k=10, n_probe=8, exclude=3)
+    assert list(ids) == list(expected)
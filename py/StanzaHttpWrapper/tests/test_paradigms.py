@@ -0,0 +1,91 @@
+import itertools
+
+import pymorphy2
+import pytest
+
+from app.utils import paradigms
+from app.utils.cache import LRUCache
+from app.utils.morph import CachedMorphAnalyzer
+from app.utils.paradigms import ParadigmTable, build_table
+
+LEMMAS = ['кошка', 'стол', 'окно', 'читать', 'красивый', 'идти']
+
+TAG_SETS = [
+    {tag for tag in combination if tag}
+    for combination in itertools.product(
+        [None, 'nomn', 'gent', 'datv', 'accs', 'ablt', 'loct'],
+        [None, 'sing', 'plur'],
+        [None, 'masc', 'femn', 'neut', 'past', 'pres', 'futr', '1per', '3per']
+    )
+    if any(combination)
+]
+
+
+@pytest.fixture(scope='module')
+def morph():
+    return pymorphy2.MorphAnalyzer()
+
+
+@pytest.fixture(scope='module')
+def table(morph, tmp_path_factory):
+    # Таблица проверяется после сохранения и загрузки через mmap, как в сервисе
+    paradigms._morph = morph
+    path = str(tmp_path_factory.mktemp('paradigms'))
+    build_table(LEMMAS).save(path)
+    return ParadigmTable.load(path)
+
+
+def _expected(morph, lemma, tags):
+    parsed = morph.parse(lemma)[0]
+    inflected = parsed.inflect(tags)
+    return parsed.normal_form, inflected.word if inflected else None
+
+
+@pytest.mark.parametrize('lemma', LEMMAS)
+def test_table_matches_pymorphy(morph, table, lemma):
+    found = 0
+    for tags in TAG_SETS:
+        result = table.inflect(lemma, tags)
+        if result is None:
+            continue
+        found += 1
+        parsed, inflected = result
+        assert (parsed.normal_form, inflected.word) == _expected(morph, lemma, tags), tags
+        assert parsed.tag == str(morph.parse(lemma)[0].tag)
+    assert found
+
+
+def test_table_misses():
+    table = build_table(LEMMAS)
+    assert table.inflect('абырвалг', {'gent', 'sing'}) is None
+    assert table.inflect('кошка', set()) is None
+    assert table.inflect('кошка', {'gent', 'Name'}) is None
+    assert table.inflect('кошка', {'gent', 'datv'}) is None
+
+
+@pytest.mark.parametrize('lemma, tags', [
+    ('абырвалг', {'gent', 'sing'}),
+    ('кошка', {'gent', 'datv'}),
+    ('кошка', {'ablt', 'plur'}),
+    ('читать', {'past', 'femn'}),
+    ('стол', {'loct', 'sing'}),
+])
+def test_analyzer_falls_back_to_pymorphy(morph, table, lemma, tags):
+    analyzer = CachedMorphAnalyzer(morph, LRUCache(0), LRUCache(0), paradigms=table)
+    parsed, inflected = analyzer.inflect(lemma, tags)
+    expected = _expected(morph, lemma, tags)
+    assert (parsed.normal_form, inflected.word if inflected else None) == expected
+
+
+def test_case_of_lemma_is_ignored(table):
+    assert table.inflect('Кошка', {'gent', 'sing'}) == table.inflect('кошка', {'gent', 'sing'})
+
+
+def test_sub_masks_cover_every_combination():
+    mask = paradigms.pack_tags({'gent', 'plur', 'femn'})
+    expected = {
+        paradigms.pack_tags(combination)
+        for size in range(1, 4)
+        for combination in itertools.combinations(['gent', 'plur', 'femn'], size)
+    }
+    assert set(paradigms._sub_masks(mask)) == expected
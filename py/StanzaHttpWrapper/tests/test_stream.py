@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.routers import stream
+
+
+def _fake_annotate(pipeline_name, texts):
+    if any(text == 'fail' for text in texts):
+        raise RuntimeError('broken batch')
+    return [{"pipeline": pipeline_name, "text": text} for text in texts]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(stream, '_annotate', _fake_annotate)
+    app = FastAPI()
+    app.include_router(stream.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _chunked(body: bytes, size: int = 7):
+    # Куски не совпадают с границами строк: тело приходит несколькими http.request
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def _records(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_chunked_upload_keeps_every_line(client, monkeypatch):
+    monkeypatch.setattr(settings, 'STREAM_BATCH_SIZE', 3)
+    lines = [json.dumps({"id": i, "text": f"Предложение номер {i}."}, ensure_ascii=False) for i in range(20)]
+    body = ('\n'.join(lines) + '\n').encode('utf-8')
+
+    response = client.post('/api/v1/text/stream?pipeline=pos', content=_chunked(body))
+
+    assert response.status_code == 200
+    records = _records(response)
+    assert [record["id"] for record in records] == list(range(20))
+    assert records[5]["result"]["text"] == "Предложение номер 5."
+
+
+def test_invalid_text_fails_only_its_line(client):
+    body = b'{"id": "a", "text": "first"}\n{"id": "b", "text": 5}\n{"id": "c", "text": "third"}\n'
+
+    response = client.post('/api/v1/text/stream?pipeline=pos', content=_chunked(body))
+
+    records = _records(response)
+    assert [record["id"] for record in records] == ["a", "b", "c"]
+    assert "error" in records[1]
+    assert records[0]["result"]["text"] == "first"
+    assert records[2]["result"]["text"] == "third"
+
+
+def test_unparseable_line_keeps_input_order(client, monkeypatch):
+    monkeypatch.setattr(settings, 'STREAM_BATCH_SIZE', 2)
+    body = b'{"id": "a", "text": "first"}\n{"id": "b", "text": \n{"id": "c", "text": "third"}\n'
+
+    response = client.post('/api/v1/text/stream?pipeline=pos', content=_chunked(body))
+
+    records = _records(response)
+    assert [record.get("id") for record in records] == ["a", 1, "c"]
+    assert "error" in records[1]
+    assert records[2]["result"]["text"] == "third"
+
+
+@pytest.mark.parametrize('chunk_size', [16, 4096])
+def test_too_long_line_is_skipped(client, monkeypatch, chunk_size):
+    monkeypatch.setattr(settings, 'STREAM_MAX_LINE_BYTES', 40)
+    long_line = json.dumps({"id": "long", "text": "x" * 200}).encode('utf-8')
+    body = b'{"id": "a", "text": "first"}\n' + long_line + b'\n{"id": "c", "text": "third"}'
+
+    response = client.post('/api/v1/text/stream?pipeline=pos', content=_chunked(body, size=chunk_size))
+
+    records = _records(response)
+    assert [record["id"] for record in records] == ["a", 1, "c"]
+    assert "error" in records[1]
+    assert records[2]["result"]["text"] == "third"
+
+
+def test_failed_batch_reports_error_per_id(client, monkeypatch):
+    monkeypatch.setattr(settings, 'STREAM_BATCH_SIZE', 2)
+    body = b'{"id": 1, "text": "ok"}\n{"id": 2, "text": "fail"}\n{"id": 3, "text": "ok"}\n'
+
+    response = client.post('/api/v1/text/stream?pipeline=pos', content=_chunked(body))
+
+    assert response.status_code == 200
+    records = _records(response)
+    assert [record["id"] for record in records] == [1, 2, 3]
+    assert "error" in records[0] and "error" in records[1]
+    assert records[2]["result"]["text"] == "ok"
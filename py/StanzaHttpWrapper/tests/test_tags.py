@@ -0,0 +1,89 @@
+import pytest
+
+from app.config import settings
+from app.utils.tags import FeatureCodec, feature_codec, map_tags_to_pymorphy, parse_features
+
+
+# Прежняя реализация на словарях: новые функции должны давать те же результаты
+def _reference_parse_features(features, features_str):
+    result = {}
+    if features_str:
+        for item in features_str.split('|'):
+            if '=' in item:
+                key, value = item.split('=', 1)
+                result[key.strip()] = value.strip()
+    if features:
+        result.update(features)
+    return result
+
+
+def _reference_map_tags(features):
+    pymorphy_tags = set()
+    is_plural = False
+    for key, value in features.items():
+        if key in ['Case', 'Number', 'Gender', 'Tense', 'Person', 'Voice']:
+            if key == 'Number' and value == 'Plur':
+                is_plural = True
+            if value in settings.TAG_MAPPING:
+                pymorphy_tags.add(settings.TAG_MAPPING[value])
+    if is_plural:
+        pymorphy_tags = {tag for tag in pymorphy_tags if tag not in {'masc', 'femn', 'neut'}}
+    return pymorphy_tags
+
+
+FEATS_STRINGS = [
+    None,
+    '',
+    '_',
+    'Case=Nom|Number=Sing',
+    'Animacy=Inan|Case=Acc|Gender=Masc|Number=Sing',
+    'Case=Gen|Gender=Fem|Number=Plur',
+    'Aspect=Perf|Gender=Neut|Mood=Ind|Number=Sing|Tense=Past|VerbForm=Fin|Voice=Act',
+    'Mood=Ind|Number=Plur|Person=3|Tense=Pres|VerbForm=Fin',
+    ' Case = Dat | Number = Sing ',
+    'Case=Nom|Broken|Number=Sing',
+    'Case=Nom|Custom=Value',
+    'Case=Xyz|Number=Sing',
+    'Gender=Masc|Number=Plur|Case=Ins',
+]
+
+
+@pytest.mark.parametrize('feats', FEATS_STRINGS)
+def test_parse_features_matches_reference(feats):
+    assert parse_features(None, feats) == _reference_parse_features(None, feats)
+
+
+@pytest.mark.parametrize('feats', FEATS_STRINGS)
+def test_map_tags_matches_reference(feats):
+    features = _reference_parse_features(None, feats)
+    assert map_tags_to_pymorphy(features) == _reference_map_tags(features)
+
+
+def test_explicit_features_override_string():
+    features = {'Case': 'Loc', 'Custom': 'Value'}
+    feats = 'Case=Nom|Number=Sing'
+    assert parse_features(features, feats) == _reference_parse_features(features, feats)
+    assert parse_features(features, None) == _reference_parse_features(features, None)
+
+
+def test_plural_drops_gender():
+    features = {'Gender': 'Fem', 'Number': 'Plur', 'Case': 'Dat'}
+    assert map_tags_to_pymorphy(features) == {'plur', 'datv'}
+    assert map_tags_to_pymorphy(features) == _reference_map_tags(features)
+
+
+def test_unknown_features_are_kept_but_not_interned():
+    codec = FeatureCodec(settings.TAG_MAPPING)
+    names, values = len(codec.names), len(codec.values)
+
+    assert codec.encode('Case=Nom|Custom=Value') is None
+    assert codec.features('Case=Nom|Custom=Value') == {'Case': 'Nom', 'Custom': 'Value'}
+    assert codec.encode_features({'Case': 'Nom', 'Custom': 'Value'}) is None
+    assert (len(codec.names), len(codec.values)) == (names, values)
+    assert not codec._encoded
+
+
+def test_encode_batch_matches_reference():
+    batch = feature_codec.encode_batch(FEATS_STRINGS)
+    assert batch.to_dicts() == [_reference_parse_features(None, feats) for feats in FEATS_STRINGS]
+    assert len(batch) == len(FEATS_STRINGS)
@@ -0,0 +1,136 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+NEURO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'neuro')
+sys.path.insert(0, os.path.join(NEURO_DIR, 'cases-errors-detection'))
+sys.path.insert(0, os.path.join(NEURO_DIR, 'cases-errors-binary'))
+
+from dataset import (encode_windows, label_list, label_map, merge_window_predictions, window_owners,
+                     window_spans)
+from cases_binary_bert import merge_window_scores
+
+WINDOW = 10
+STRIDE = 4
+
+
+class _Encoding(dict):
+    def __init__(self, input_ids, word_ids):
+        super().__init__(input_ids=input_ids)
+        self._word_ids = word_ids
+
+    def word_ids(self):
+        return self._word_ids
+
+
+class _Tokenizer:
+    """Токенизатор с [CLS]/[SEP], делящий слова длиннее трёх букв на два подтокена"""
+    CLS, SEP = 1, 2
+
+    def __call__(self, words, is_split_into_words=True, add_special_tokens=False):
+        input_ids, word_ids = [], []
+        for word_id, word in enumerate(words):
+            for _ in range(2 if len(word) > 3 else 1):
+                input_ids.append(100 + word_id)
+                word_ids.append(word_id)
+        return _Encoding(input_ids, word_ids)
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [self.CLS] + list(ids) + [self.SEP]
+
+    def get_special_tokens_mask(self, ids):
+        return [1] + [0] * len(ids) + [1]
+
+
+def _check_spans(n_tokens, spans):
+    covered = np.zeros(n_tokens, dtype=bool)
+    for start, end in spans:
+        assert 0 <= start < end <= n_tokens
+        assert end - start == min(WINDOW, n_tokens)
+        covered[start:end] = True
+    assert covered.all()
+    assert spans[0][0] == 0 and spans[-1][1] == n_tokens
+    for (prev_start, prev_end), (start, end) in zip(spans, spans[1:]):
+        assert prev_start < start
+        assert prev_end - start >= STRIDE
+
+
+@pytest.mark.parametrize('n_tokens', [1, 5, WINDOW])
+def test_short_document_is_one_window(n_tokens):
+    assert window_spans(n_tokens, WINDOW, STRIDE) == [(0, n_tokens)]
+
+
+@pytest.mark.parametrize('n_tokens', [WINDOW + (WINDOW - STRIDE), WINDOW + 3 * (WINDOW - STRIDE)])
+def test_exact_multiple_of_stride(n_tokens):
+    spans = window_spans(n_tokens, WINDOW, STRIDE)
+    assert spans == [(start, start + WINDOW) for start in range(0, n_tokens - WINDOW + 1, WINDOW - STRIDE)]
+    _check_spans(n_tokens, spans)
+
+
+@pytest.mark.parametrize('n_tokens', [WINDOW + 1, WINDOW + (WINDOW - STRIDE) + 1, 37])
+def test_last_partial_window_ends_at_document_end(n_tokens):
+    spans = window_spans(n_tokens, WINDOW, STRIDE)
+    assert spans[-1] == (n_tokens - WINDOW, n_tokens)
+    _check_spans(n_tokens, spans)
+
+
+def test_stride_must_be_smaller_than_window():
+    with pytest.raises(ValueError):
+        window_spans(20, WINDOW, WINDOW)
+
+
+@pytest.mark.parametrize('n_tokens', [5, WINDOW, 16, 22, 37])
+def test_each_token_owned_by_one_containing_window(n_tokens):
+    spans = window_spans(n_tokens, WINDOW, STRIDE)
+    owners = window_owners(spans, n_tokens)
+    for position, owner in enumerate(owners):
+        start, end = spans[owner]
+        assert start <= position < end
+        margin = min(position - start, end - 1 - position)
+        for other_start, other_end in spans:
+            if other_start <= position < other_end:
+                assert margin >= min(position - other_start, other_end - 1 - position)
+
+
+@pytest.mark.parametrize('n_words', [1, 4, 9, 12, 30])
+def test_windows_label_every_token_once_and_merge_back(n_words):
+    tokenizer = _Tokenizer()
+    words = [('слово' if i % 3 else 'я') + str(i) for i in range(n_words)]
+    labels = [label_list[i % len(label_list)] for i in range(n_words)]
+    windows = encode_windows(words, labels, tokenizer, max_length=WINDOW + 2, stride=STRIDE)
+    content = tokenizer(words)
+
+    spans = window_spans(len(content['input_ids']), WINDOW, STRIDE)
+    assert len(windows) == len(spans)
+
+    labelled = [0] * len(content['input_ids'])
+    for window, (start, end) in zip(windows, spans):
+        assert window['input_ids'] == tokenizer.build_inputs_with_special_tokens(content['input_ids'][start:end])
+        assert len(window['input_ids']) == len(window['labels']) == len(window['word_index'])
+        for offset, (token, label) in enumerate(zip(window['input_ids'][1:-1], window['labels'][1:-1])):
+            if label != -100:
+                assert label == label_map[labels[token - 100]]
+                labelled[start + offset] += 1
+    assert labelled == [1] * len(content['input_ids'])
+
+    # Предсказания, совпадающие с метками, собираются обратно ровно в метки слов
+    predicted = [[max(label, 0) for label in window['labels']] for window in windows]
+    merged = merge_window_predictions(
+        predicted,
+        [window['word_index'] for window in windows],
+        [0] * len(windows),
+        [n_words]
+    )
+    assert merged == [labels]
+    first_tokens = sorted(word for window in windows for word in window['word_index'] if word >= 0)
+    assert first_tokens == list(range(n_words))
+
+
+def test_merge_window_scores_takes_minimum_per_document():
+    scores = merge_window_scores([0, 0, 1, 0], [0.9, 0.2, 0.7, 0.6], 3)
+    assert scores.tolist() == pytest.approx([0.2, 0.7, 1.0])